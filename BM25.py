@@ -1,19 +1,436 @@
+import functools
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+import itertools
 import math
-from collections import defaultdict
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import weakref
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from collections.abc import Mapping, Sequence
+from array import array
 import re
 
-class BM25Okapi:
+# NumPy and SciPy are only needed for the sparse-matrix backend (BM25Sparse)
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+# --- On-disk index format ---
+#
+# All integers are little-endian. The file starts with INDEX_MAGIC and a
+# fixed header (INDEX_HEADER) followed by these sections:
+#   doc lengths      uint32 per corpus slot
+#   doc offsets      uint64 per corpus slot + 1, into the document blob
+#   removed doc ids  uint64 per removed corpus slot
+#   term offsets     uint64 per term + 1, into the term blob (terms sorted by UTF-8 bytes)
+#   term records     TERM_RECORD per term: postings offset, postings size, df, tf bound
+#   document blob    UTF-8 text of every document
+#   term blob        UTF-8 text of every term
+#   postings         per term, (doc id delta, term frequency) pairs as varints
+INDEX_MAGIC = b'BM25IDX1'
+INDEX_HEADER = struct.Struct('<ddQQQdQQQQQQQQQQ')
+TERM_RECORD = struct.Struct('<QQQd')
+
+def _encode_varint(value, out):
+    """Appends value to the bytearray out as an unsigned LEB128 varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_postings(buffer, start, end):
+    """
+    Decodes a delta + varint compressed postings list.
+
+    Args:
+        buffer (bytes-like): The buffer holding the postings.
+        start (int): Offset of the first byte of the postings list.
+        end (int): Offset one past its last byte.
+
+    Returns:
+        tuple: (list of doc ids, list of term frequencies).
+    """
+    values = []
+    value = shift = 0
+    for byte in buffer[start:end]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+
+    doc_ids = list(itertools.accumulate(values[0::2]))
+    return doc_ids, values[1::2]
+
+class _MappedTermTable(Mapping):
+    """
+    Read-only, dict-like view of one per-term field of a memory-mapped index.
+
+    Terms are found by binary search over the sorted term blob, so opening
+    an index does not build any per-term Python objects.
+    """
+
+    def __init__(self, index_file, field):
+        """
+        Args:
+            index_file (_MappedIndexFile): The opened index file.
+            field (str): 'postings', 'doc_freqs' or 'term_upper_bounds'.
+        """
+        self.index_file = index_file
+        self.field = field
+
+    def __getitem__(self, term):
+        position = self.index_file.find_term(term)
+        if position is None:
+            raise KeyError(term)
+        return self.index_file.term_field(position, self.field)
+
+    def __contains__(self, term):
+        return self.index_file.find_term(term) is not None
+
+    def __iter__(self):
+        return (self.index_file.term_at(position) for position in range(self.index_file.n_terms))
+
+    def __len__(self):
+        return self.index_file.n_terms
+
+class _MappedCorpus(Sequence):
+    """Read-only view of the documents stored in a memory-mapped index."""
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+
+    def __getitem__(self, doc_id):
+        if isinstance(doc_id, slice):
+            return [self[i] for i in range(*doc_id.indices(len(self)))]
+        return self.index_file.document_at(doc_id)
+
+    def __len__(self):
+        return self.index_file.n_slots
+
+class _MappedIndexFile:
+    """
+    An index file opened with mmap, plus accessors for its sections.
+
+    Every process that opens the same file shares one page-cached copy of
+    it. Decoded postings lists are kept in a small LRU cache.
+    """
+
+    def __init__(self, path, postings_cache_size=4096):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.buffer[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a BM25 index file")
+
+        (self.k1, self.b, self.n_slots, self.doc_count, self.total_doc_length,
+         self.avg_doc_length, self.n_terms, doc_lengths_offset, doc_offsets_offset,
+         removed_offset, self.removed_count, term_offsets_offset, term_records_offset,
+         self.doc_blob_offset, self.term_blob_offset,
+         self.postings_offset) = INDEX_HEADER.unpack_from(self.buffer, len(INDEX_MAGIC))
+
+        view = memoryview(self.buffer)
+        self.doc_lengths = view[doc_lengths_offset:doc_lengths_offset + 4 * self.n_slots].cast('I')
+        self.doc_offsets = view[doc_offsets_offset:doc_offsets_offset + 8 * (self.n_slots + 1)].cast('Q')
+        self.removed_doc_ids = set(view[removed_offset:removed_offset + 8 * self.removed_count].cast('Q'))
+        self.term_offsets = view[term_offsets_offset:term_offsets_offset + 8 * (self.n_terms + 1)].cast('Q')
+        self.term_records_offset = term_records_offset
+        self._decode_postings = functools.lru_cache(maxsize=postings_cache_size)(self._read_postings)
+
+    def term_at(self, position):
+        """Returns the term stored at a position of the sorted vocabulary."""
+        start = self.term_blob_offset + self.term_offsets[position]
+        end = self.term_blob_offset + self.term_offsets[position + 1]
+        return self.buffer[start:end].decode('utf-8')
+
+    def find_term(self, term):
+        """Binary-searches the vocabulary, returning the term's position or None."""
+        key = term.encode('utf-8')
+        low, high = 0, self.n_terms
+        while low < high:
+            mid = (low + high) // 2
+            start = self.term_blob_offset + self.term_offsets[mid]
+            end = self.term_blob_offset + self.term_offsets[mid + 1]
+            if self.buffer[start:end] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.n_terms and self.term_at(low) == term:
+            return low
+        return None
+
+    def term_field(self, position, field):
+        """Reads one field of the term record at a vocabulary position."""
+        postings_start, postings_size, doc_freq, tf_bound = TERM_RECORD.unpack_from(
+            self.buffer, self.term_records_offset + position * TERM_RECORD.size
+        )
+        if field == 'postings':
+            return self._decode_postings(postings_start, postings_size)
+        if field == 'doc_freqs':
+            return doc_freq
+        return tf_bound, self.avg_doc_length
+
+    def _read_postings(self, postings_start, postings_size):
+        start = self.postings_offset + postings_start
+        return _decode_postings(self.buffer, start, start + postings_size)
+
+    def document_at(self, doc_id):
+        """Returns the text of a document, or None if it was removed."""
+        if doc_id < 0:
+            doc_id += self.n_slots
+        if not 0 <= doc_id < self.n_slots:
+            raise IndexError("document id out of range")
+        if doc_id in self.removed_doc_ids:
+            return None
+        start = self.doc_blob_offset + self.doc_offsets[doc_id]
+        end = self.doc_blob_offset + self.doc_offsets[doc_id + 1]
+        return self.buffer[start:end].decode('utf-8')
+
+
+# A small English stopword list, e.g. for Analyzer(stopwords=ENGLISH_STOP_WORDS)
+ENGLISH_STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its no not of on or
+such that the their then there these they this to was were what when where which who why
+will with you your
+""".split())
+
+def suffix_stemmer(token):
+    """
+    A minimal English stemmer that strips a few common suffixes. Use a real
+    stemmer (e.g. nltk's PorterStemmer().stem) when quality matters.
+
+    Args:
+        token (str): A normalized token.
+
+    Returns:
+        str: The stemmed token.
+    """
+    for suffix in ('ingly', 'edly', 'ing', 'ies', 'ed', 'ly', 'es', 's'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + ('y' if suffix == 'ies' else '')
+    return token
+
+class Analyzer:
+    """
+    Text analysis chain used to turn documents and queries into terms:
+    normalizer -> tokenizer -> stopword filter -> stemmer.
+
+    The default chain (lowercase, then `\\w+` tokens) is the original BM25Okapi
+    tokenizer. The chain is compiled once into a single function, and the
+    common case with no stopwords or stemmer runs as one regex call. Stems
+    are memoized per token, and analyzed query strings are kept in an LRU
+    cache since evaluation and search traffic repeat queries often.
+    """
+
+    def __init__(self, normalizer=str.lower, token_pattern=r'\w+', stopwords=None, stemmer=None,
+                 query_cache_size=1024):
+        """
+        Args:
+            normalizer (callable, optional): str -> str applied before
+                tokenizing, or None. Defaults to str.lower.
+            token_pattern (str, optional): Regex matching one token. Defaults to r'\\w+'.
+            stopwords (iterable of str, optional): Normalized tokens to drop. Defaults to None.
+            stemmer (callable, optional): str -> str applied to each kept token,
+                e.g. nltk's PorterStemmer().stem. Defaults to None.
+            query_cache_size (int, optional): Number of analyzed queries to cache.
+                Defaults to 1024.
+        """
+        self.normalizer = normalizer
+        self.token_pattern = token_pattern
+        self.stopwords = frozenset(stopwords or ())
+        self.stemmer = stemmer
+        self.query_cache_size = query_cache_size
+        self._compile()
+
+    def _compile(self):
+        """Builds the analysis function and the query cache for this configuration."""
+        findall = re.compile(self.token_pattern).findall
+        normalizer = self.normalizer
+        stopwords = self.stopwords
+        stem = functools.lru_cache(maxsize=65536)(self.stemmer) if self.stemmer is not None else None
+
+        if normalizer is None:
+            tokenize = findall
+        else:
+            def tokenize(text):
+                return findall(normalizer(text))
+
+        if not stopwords and stem is None:
+            # Fast path: the whole chain is a single regex call
+            analyze = tokenize
+        elif stem is None:
+            def analyze(text):
+                return [token for token in tokenize(text) if token not in stopwords]
+        else:
+            def analyze(text):
+                return [stem(token) for token in tokenize(text) if token not in stopwords]
+
+        self._analyze = analyze
+        self.analyze_query = functools.lru_cache(maxsize=self.query_cache_size)(self._analyze_query)
+
+    def __call__(self, text):
+        """
+        Analyzes a document.
+
+        Args:
+            text (str): The input string.
+
+        Returns:
+            list of str: A list of terms.
+        """
+        return self._analyze(text)
+
+    def _analyze_query(self, query):
+        # Tuples, since cached results are shared between callers
+        return tuple(self._analyze(query))
+
+    def __getstate__(self):
+        # The compiled functions and caches are rebuilt rather than pickled
+        state = self.__dict__.copy()
+        del state['_analyze']
+        del state['analyze_query']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+# Empty index each shard-building worker process uses to tokenize its documents
+_shard_worker_index = None
+
+def _init_shard_worker(index_cls, k1, b, analyzer):
+    """Process pool initializer: creates the worker's empty index once."""
+    global _shard_worker_index
+    _shard_worker_index = index_cls([], k1=k1, b=b, analyzer=analyzer)
+
+def _index_shard(shard):
+    """
+    Builds partial BM25 statistics for one shard of the corpus.
+
+    Args:
+        shard (tuple): (id of the shard's first document, list of documents).
+
+    Returns:
+        tuple: (doc lengths, postings, doc frequencies).
+    """
+    start, docs = shard
+    index = _shard_worker_index
+    index.doc_lengths, index.doc_term_freqs = [], []
+    index.postings, index.doc_freqs = {}, {}
+    index.vocab, index.terms = {}, []
+    for offset, doc in enumerate(docs):
+        index._index_document(start + offset, doc)
+    # Term frequencies are already in the postings; shipping them back per
+    # document would double the data the parent has to unpickle
+    return index.doc_lengths, index.postings, index.doc_freqs
+
+# Index each query worker process answers its share of a batch from
+_query_worker_index = None
+
+# Index -> {"n_jobs", "executor", "temp_dir"} kept between get_top_n_batch
+# calls; weak keys so a pool never keeps its index alive
+_query_pools = weakref.WeakKeyDictionary()
+
+def _shutdown_query_pool(pool, wait=True):
+    """Stops a query pool's workers and deletes the index file saved for them."""
+    if pool["executor"] is not None:
+        pool["executor"].shutdown(wait=wait)
+    if pool["temp_dir"] is not None:
+        shutil.rmtree(pool["temp_dir"], ignore_errors=True)
+    pool["n_jobs"] = pool["executor"] = pool["temp_dir"] = None
+
+def _init_query_worker(index_cls, index_path, analyzer):
+    """Process pool initializer: memory-maps the index file."""
+    global _query_worker_index
+    _query_worker_index = index_cls.load(index_path, mmap=True, analyzer=analyzer)
+
+def _query_chunk(args):
+    """Answers one chunk of a get_top_n_batch call inside a worker process."""
+    queries, n = args
+    return _query_worker_index.get_top_n_batch(queries, n)
+
+class _BM25Base:
+    """
+    What every BM25 backend shares: the corpus, the BM25 parameters, the
+    analyzer and the interned vocabulary.
+    """
+
+    def __init__(self, corpus, k1=1.5, b=0.75, analyzer=None):
+        # Copied, so updating an index never modifies the caller's list
+        self.corpus = list(corpus)
+        self.k1 = k1
+        self.b = b
+        self.analyzer = analyzer if analyzer is not None else Analyzer()
+        # Number of live (not removed) documents
+        self.doc_count = len(self.corpus)
+        # Interned vocabulary: term -> term id, and term id -> term
+        self.vocab = {}
+        self.terms = []
+
+    def _tokenize(self, text):
+        """
+        Runs a document through the analyzer.
+
+        Args:
+            text (str): The input string.
+
+        Returns:
+            list of str: A list of tokens.
+        """
+        return self.analyzer(text)
+
+    def _tokenize_query(self, query):
+        """
+        Runs a query through the analyzer, using its LRU cache of recent queries.
+
+        Args:
+            query (str): The search query.
+
+        Returns:
+            tuple of str: The query tokens.
+        """
+        return self.analyzer.analyze_query(query)
+
+    def _term_id(self, term):
+        """Returns the interned id of a term, assigning a new one if needed."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.vocab[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+class BM25Okapi(_BM25Base):
     """
     A class for performing BM25 keyword search on a corpus of documents.
 
     BM25 is a ranking function used to estimate the relevance of documents to a
     given search query. It is based on the probabilistic retrieval framework.
+
+    Documents can be added and removed after construction. A document's id is
+    its position in `corpus` and never changes; removed documents leave a
+    None hole in `corpus` and always score 0.
     """
-    
+
+    # A term's postings list is compacted once this fraction of it belongs to
+    # removed documents
+    compaction_ratio = 0.25
+
     # Free parameters for the BM25 formula.
     # k1 is for term frequency saturation. A higher value means TF plays a larger role.
     # b is for document length normalization. 0 means no normalization, 1 means full normalization.
-    def __init__(self, corpus, k1=1.5, b=0.75):
+    def __init__(self, corpus, k1=1.5, b=0.75, n_jobs=1, chunk_size=10000, analyzer=None):
         """
         Initializes the BM25 model.
 
@@ -21,63 +438,494 @@ class BM25Okapi:
             corpus (list of str): A list of documents to be indexed.
             k1 (float, optional): BM25 parameter. Defaults to 1.5.
             b (float, optional): BM25 parameter. Defaults to 0.75.
+            n_jobs (int, optional): Worker processes used to build the index.
+                None uses every CPU. Defaults to 1 (no process pool).
+            chunk_size (int, optional): Documents per shard sent to a worker
+                when n_jobs > 1. Defaults to 10000.
+            analyzer (Analyzer, optional): Turns documents and queries into
+                terms. Defaults to Analyzer() (lowercased \w+ tokens).
         """
-        self.corpus = corpus
-        self.k1 = k1
-        self.b = b
-        self.doc_count = len(corpus)
+        super().__init__(corpus, k1=k1, b=b, analyzer=analyzer)
+        self.n_jobs = n_jobs if n_jobs is not None else os.cpu_count()
+        self.chunk_size = chunk_size
         self.doc_lengths = []
+        self.total_doc_length = 0
         self.avg_doc_length = 0
-        self.doc_freqs = []
+        # Term -> number of live documents containing it
+        self.doc_freqs = {}
+        # IDF cache, filled lazily for the current doc_count
         self.idf = {}
+        self._idf_doc_count = None
+        # Per-document {term id: frequency}; None where they were not kept
+        # (parallel build, loaded index) and are re-derived from the text when needed
         self.doc_term_freqs = []
+        # Inverted index: term -> (list of doc ids, list of term frequencies)
+        self.postings = {}
+        # Term -> (highest saturated tf over its postings, avg_doc_length it was computed at)
+        self.term_upper_bounds = {}
+        # Removed doc id -> number of postings lists that still reference it
+        self.deleted_doc_ids = {}
+        # Term -> number of removed documents still in its postings list
+        self._dead_postings = {}
+        # Set by load(mmap=True); the index is read from this file until it is modified
+        self._index_file = None
 
         self._initialize()
 
-    def _tokenize(self, text):
+    def _doc_terms(self, doc_id):
         """
-        Simple tokenizer that splits text into lowercased words.
-        
+        Returns a live document's term frequencies keyed by term.
+
         Args:
-            text (str): The input string.
+            doc_id (int): The id of the document.
 
         Returns:
-            list of str: A list of tokens.
+            dict: Term -> frequency in the document.
         """
-        # Use regex to find all words, convert to lower case
-        return re.findall(r'\w+', text.lower())
+        term_freqs = self.doc_term_freqs[doc_id]
+        if term_freqs is None:
+            return Counter(self._tokenize(self.corpus[doc_id]))
+        return {self.terms[term_id]: freq for term_id, freq in term_freqs.items()}
 
     def _initialize(self):
         """
         Pre-processes the corpus to calculate necessary statistics for BM25.
         This includes document lengths, term frequencies, and IDF scores.
         """
-        # Temporary storage for document frequency calculation
-        df = defaultdict(int)
-        total_doc_length = 0
-
-        # Iterate through each document in the corpus
-        for doc in self.corpus:
-            tokens = self._tokenize(doc)
-            self.doc_lengths.append(len(tokens))
-            total_doc_length += len(tokens)
-            
-            # Calculate term frequencies for the current document
-            term_freqs = defaultdict(int)
-            for token in tokens:
-                term_freqs[token] += 1
-            self.doc_term_freqs.append(term_freqs)
-            
-            # Update document frequencies (count of docs containing a term)
-            for token in set(tokens):
-                df[token] += 1
-
-        self.avg_doc_length = total_doc_length / self.doc_count if self.doc_count > 0 else 0
-        
-        # Calculate IDF for each term in the vocabulary
-        for term, freq in df.items():
-            # Standard IDF formula
-            self.idf[term] = math.log((self.doc_count - freq + 0.5) / (freq + 0.5) + 1.0)
+        if self.n_jobs > 1 and len(self.corpus) > self.chunk_size:
+            self._index_corpus_parallel()
+        else:
+            # Iterate through each document in the corpus
+            for doc_id, doc in enumerate(self.corpus):
+                self._index_document(doc_id, doc)
+
+        self.avg_doc_length = self.total_doc_length / self.doc_count if self.doc_count > 0 else 0
+
+        # Calculate IDF and the score upper bound for each term in the vocabulary
+        for term in self.postings:
+            self._get_idf(term)
+            self.term_upper_bounds[term] = (self._compute_tf_bound(term), self.avg_doc_length)
+
+    def _index_document(self, doc_id, doc):
+        """
+        Tokenizes one document and appends it to the postings lists.
+
+        Args:
+            doc_id (int): The id (corpus position) of the document.
+            doc (str): The document text.
+        """
+        tokens = self._tokenize(doc)
+        self.doc_lengths.append(len(tokens))
+        self.total_doc_length += len(tokens)
+
+        # Calculate term frequencies for the current document. They are kept
+        # by interned term id, so documents share one object per term
+        term_freqs = {}
+
+        # Update document frequencies (count of docs containing a term)
+        # and append this document to the postings list of each term.
+        # Doc ids only grow, so every postings list stays sorted
+        vocab = self.vocab
+        for token, freq in Counter(tokens).items():
+            term_id = vocab.get(token)
+            if term_id is None:
+                term_id = self._term_id(token)
+            term_freqs[term_id] = freq
+            self.doc_freqs[token] = self.doc_freqs.get(token, 0) + 1
+            if token not in self.postings:
+                self.postings[token] = ([], [])
+            doc_ids, tfs = self.postings[token]
+            doc_ids.append(doc_id)
+            tfs.append(freq)
+
+        self.doc_term_freqs.append(term_freqs)
+
+    def _index_corpus_parallel(self):
+        """
+        Indexes the corpus in chunk_size shards across n_jobs worker processes.
+
+        Each worker tokenizes its shard into partial statistics (lengths,
+        postings and document frequencies keyed by global doc id). Shards come
+        back in corpus order, so merging them only has to concatenate each
+        term's postings. Per-document term frequencies are left as None and
+        re-derived from the text if the document is removed.
+        """
+        shards = (
+            (start, self.corpus[start:start + self.chunk_size])
+            for start in range(0, len(self.corpus), self.chunk_size)
+        )
+        with ProcessPoolExecutor(
+            max_workers=self.n_jobs,
+            initializer=_init_shard_worker,
+            initargs=(type(self), self.k1, self.b, self.analyzer),
+        ) as executor:
+            for doc_lengths, postings, doc_freqs in executor.map(_index_shard, shards):
+                self.doc_lengths.extend(doc_lengths)
+                self.total_doc_length += sum(doc_lengths)
+                self.doc_term_freqs.extend([None] * len(doc_lengths))
+                for term, (doc_ids, tfs) in postings.items():
+                    if term in self.postings:
+                        merged_doc_ids, merged_tfs = self.postings[term]
+                        merged_doc_ids.extend(doc_ids)
+                        merged_tfs.extend(tfs)
+                        self.doc_freqs[term] += doc_freqs[term]
+                    else:
+                        self._term_id(term)
+                        self.postings[term] = (doc_ids, tfs)
+                        self.doc_freqs[term] = doc_freqs[term]
+
+    def _length_norm_params(self):
+        """
+        Returns the constant and per-token parts of the BM25 length
+        normalization, k1 * (1 - b) + k1 * b / avgdl * doc_len.
+        """
+        per_token = self.k1 * self.b / self.avg_doc_length if self.avg_doc_length > 0 else 0
+        return self.k1 * (1 - self.b), per_token
+
+    def _get_idf(self, term):
+        """
+        Returns the IDF of a term, computing it only if it is not cached for
+        the current number of documents.
+
+        Args:
+            term (str): A term present in the index.
+
+        Returns:
+            float: The IDF of the term.
+        """
+        # Every IDF depends on doc_count, so a change in it invalidates the cache
+        if self._idf_doc_count != self.doc_count:
+            self.idf.clear()
+            self._idf_doc_count = self.doc_count
+
+        idf = self.idf.get(term)
+        if idf is None:
+            idf = self._idf_formula(self.doc_count, self.doc_freqs[term])
+            self.idf[term] = idf
+        return idf
+
+    @staticmethod
+    def _idf_formula(doc_count, freq):
+        """
+        Computes the BM25 IDF of a term.
+
+        Args:
+            doc_count (int): Number of documents in the collection.
+            freq (int): Number of documents containing the term.
+
+        Returns:
+            float: The IDF.
+        """
+        # Standard IDF formula
+        return math.log((doc_count - freq + 0.5) / (freq + 0.5) + 1.0)
+
+    def _compute_tf_bound(self, term):
+        """
+        Computes the maximum saturated term frequency of a term over its live
+        postings at the current average document length.
+
+        Args:
+            term (str): A term present in the index.
+
+        Returns:
+            float: The largest tf * (k1 + 1) / (tf + norm) of the term in any document.
+        """
+        k1_plus_1 = self.k1 + 1
+        norm_base, norm_scale = self._length_norm_params()
+        doc_lengths = self.doc_lengths
+        deleted = self.deleted_doc_ids
+        doc_ids, tfs = self.postings[term]
+        return max(
+            (freq * k1_plus_1 / (freq + (norm_base + norm_scale * doc_lengths[doc_id]))
+             for doc_id, freq in zip(doc_ids, tfs) if doc_id not in deleted),
+            default=0.0,
+        )
+
+    def _term_upper_bound(self, term):
+        """
+        Returns an upper bound on the score a single occurrence of a term can
+        add to any document.
+
+        The stored bound was computed at an older average document length. A
+        longer average only shrinks each document's length penalty, by at
+        most the ratio of the two averages, so scaling by that ratio keeps the
+        bound safe without rescanning the postings.
+
+        Args:
+            term (str): A term present in the index.
+
+        Returns:
+            float: The score upper bound of the term.
+        """
+        tf_bound, bound_avg_doc_length = self.term_upper_bounds[term]
+        if bound_avg_doc_length > 0 and self.avg_doc_length > bound_avg_doc_length:
+            tf_bound *= self.avg_doc_length / bound_avg_doc_length
+        return self._get_idf(term) * tf_bound
+
+    def save(self, path):
+        """
+        Writes the index to a compact binary file that load() can memory-map.
+
+        Postings are stored as delta + varint encoded (doc id, term frequency)
+        pairs. Deleted entries are compacted away first. The file is written
+        next to path and renamed into place, so readers never see a partial file.
+
+        Args:
+            path (str): The file to write.
+        """
+        for term in list(self._dead_postings):
+            self._compact_postings(term)
+
+        n_slots = len(self.corpus)
+        doc_lengths = array('I', self.doc_lengths)
+        doc_offsets = array('Q', [0])
+        removed_doc_ids = array('Q')
+        doc_blob = bytearray()
+        for doc_id, doc in enumerate(self.corpus):
+            if doc is None:
+                removed_doc_ids.append(doc_id)
+            else:
+                doc_blob += doc.encode('utf-8')
+            doc_offsets.append(len(doc_blob))
+
+        terms = sorted(self.postings, key=lambda term: term.encode('utf-8'))
+        term_offsets = array('Q', [0])
+        term_blob = bytearray()
+        term_records = bytearray()
+        postings_blob = bytearray()
+        for term in terms:
+            term_blob += term.encode('utf-8')
+            term_offsets.append(len(term_blob))
+
+            postings_start = len(postings_blob)
+            previous_doc_id = 0
+            doc_ids, tfs = self.postings[term]
+            for doc_id, freq in zip(doc_ids, tfs):
+                _encode_varint(doc_id - previous_doc_id, postings_blob)
+                _encode_varint(freq, postings_blob)
+                previous_doc_id = doc_id
+
+            # Store the bound at the current avg_doc_length so the loader needs no rescaling
+            tf_bound, bound_avg_doc_length = self.term_upper_bounds[term]
+            if bound_avg_doc_length > 0 and self.avg_doc_length > bound_avg_doc_length:
+                tf_bound *= self.avg_doc_length / bound_avg_doc_length
+            term_records += TERM_RECORD.pack(
+                postings_start, len(postings_blob) - postings_start, self.doc_freqs[term], tf_bound
+            )
+
+        # Lay out the sections after the header, 8-byte aligned
+        sections = [doc_lengths.tobytes(), doc_offsets.tobytes(), removed_doc_ids.tobytes(),
+                    term_offsets.tobytes(), bytes(term_records), bytes(doc_blob), bytes(term_blob),
+                    bytes(postings_blob)]
+        offsets = []
+        position = len(INDEX_MAGIC) + INDEX_HEADER.size
+        for section in sections:
+            position += -position % 8
+            offsets.append(position)
+            position += len(section)
+
+        header = INDEX_HEADER.pack(
+            self.k1, self.b, n_slots, self.doc_count, self.total_doc_length, self.avg_doc_length,
+            len(terms), offsets[0], offsets[1], offsets[2], len(removed_doc_ids), offsets[3],
+            offsets[4], offsets[5], offsets[6], offsets[7],
+        )
+
+        temp_path = f"{path}.tmp{os.getpid()}"
+        with open(temp_path, 'wb') as f:
+            f.write(INDEX_MAGIC + header)
+            for offset, section in zip(offsets, sections):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(section)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True, analyzer=None):
+        """
+        Loads an index written by save().
+
+        With mmap=True the file is memory-mapped and read lazily: opening it
+        only parses the header, documents and postings are decoded on first
+        use, and all processes that load the same file share its pages. The
+        index is copied into memory the first time it is modified.
+
+        Args:
+            path (str): The index file.
+            mmap (bool, optional): Memory-map the file instead of reading it
+                into memory. Defaults to True.
+            analyzer (Analyzer, optional): Must match the analyzer the index
+                was built with. Defaults to Analyzer().
+
+        Returns:
+            BM25Okapi: The loaded index.
+        """
+        index_file = _MappedIndexFile(path)
+        index = cls([], k1=index_file.k1, b=index_file.b, analyzer=analyzer)
+        index._index_file = index_file
+        index.corpus = _MappedCorpus(index_file)
+        index.doc_count = index_file.doc_count
+        index.doc_lengths = index_file.doc_lengths
+        index.total_doc_length = index_file.total_doc_length
+        index.avg_doc_length = index_file.avg_doc_length
+        index.doc_freqs = _MappedTermTable(index_file, 'doc_freqs')
+        index.postings = _MappedTermTable(index_file, 'postings')
+        index.term_upper_bounds = _MappedTermTable(index_file, 'term_upper_bounds')
+        index.doc_term_freqs = None
+
+        if not mmap:
+            index._materialize()
+        return index
+
+    def _materialize(self):
+        """
+        Copies a memory-mapped index into regular in-memory structures so it
+        can be modified. Does nothing for an index that is already in memory.
+        """
+        if self._index_file is None:
+            return
+
+        self.corpus = list(self.corpus)
+        self.doc_lengths = list(self.doc_lengths)
+        terms = list(enumerate(self.postings))
+        self.doc_freqs = {term: self._index_file.term_field(position, 'doc_freqs') for position, term in terms}
+        self.term_upper_bounds = {term: self._index_file.term_field(position, 'term_upper_bounds')
+                                  for position, term in terms}
+        # Copy the lists, since decoded postings may be shared with the LRU cache
+        self.postings = {}
+        for position, term in terms:
+            doc_ids, tfs = self._index_file.term_field(position, 'postings')
+            self.postings[term] = (list(doc_ids), list(tfs))
+        self.terms = [term for _, term in terms]
+        self.vocab = {term: term_id for term_id, term in terms}
+        # Per-document term frequencies are not stored; they are re-derived on removal
+        self.doc_term_freqs = [None] * len(self.corpus)
+        self._index_file = None
+
+    def add_documents(self, documents):
+        """
+        Adds documents to the index without rebuilding it.
+
+        New documents are appended to the existing postings lists, so the cost
+        depends only on the size of the new documents. IDFs are recomputed
+        lazily at query time, and only the score bounds of the terms in the
+        new documents are touched.
+
+        Args:
+            documents (list of str): The documents to add.
+
+        Returns:
+            list of int: The ids assigned to the new documents.
+        """
+        # Query workers hold a copy of the old index
+        self.close_query_pool()
+        self._materialize()
+        new_doc_ids = []
+        for doc in documents:
+            doc_id = len(self.corpus)
+            self.corpus.append(doc)
+            self._index_document(doc_id, doc)
+            new_doc_ids.append(doc_id)
+
+        self.doc_count += len(new_doc_ids)
+        self.avg_doc_length = self.total_doc_length / self.doc_count if self.doc_count > 0 else 0
+
+        # Fold the new postings into each affected term's bound at the new average length
+        k1_plus_1 = self.k1 + 1
+        norm_base, norm_scale = self._length_norm_params()
+        new_tf_bounds = defaultdict(float)
+        for doc_id in new_doc_ids:
+            norm = norm_base + norm_scale * self.doc_lengths[doc_id]
+            for term_id, freq in self.doc_term_freqs[doc_id].items():
+                term = self.terms[term_id]
+                new_tf_bounds[term] = max(new_tf_bounds[term], freq * k1_plus_1 / (freq + norm))
+
+        for term, tf_bound in new_tf_bounds.items():
+            # The term's doc frequency changed, so its cached IDF is stale
+            self.idf.pop(term, None)
+            if term in self.term_upper_bounds:
+                old_bound, bound_avg_doc_length = self.term_upper_bounds[term]
+                if bound_avg_doc_length > 0 and self.avg_doc_length > bound_avg_doc_length:
+                    old_bound *= self.avg_doc_length / bound_avg_doc_length
+                tf_bound = max(tf_bound, old_bound)
+            self.term_upper_bounds[term] = (tf_bound, self.avg_doc_length)
+
+        return new_doc_ids
+
+    def remove_documents(self, doc_ids):
+        """
+        Removes documents from the index without rebuilding it.
+
+        Removed documents are marked as deleted and skipped by scoring. Each
+        term's postings list is compacted once the share of deleted entries
+        in it exceeds `compaction_ratio`, so the work per removal stays
+        amortized constant per posting regardless of index size.
+
+        Args:
+            doc_ids (list of int): Ids of the documents to remove.
+        """
+        # Validate every id first so a bad one cannot leave the index half-updated
+        doc_ids = list(doc_ids)
+        for doc_id in doc_ids:
+            if not 0 <= doc_id < len(self.corpus):
+                raise IndexError(f"Document id {doc_id} out of range")
+
+        # Query workers hold a copy of the old index
+        self.close_query_pool()
+        self._materialize()
+        affected_terms = set()
+        for doc_id in doc_ids:
+            if self.corpus[doc_id] is None:
+                continue
+
+            term_freqs = self._doc_terms(doc_id)
+            for term in term_freqs:
+                self.doc_freqs[term] -= 1
+                self.idf.pop(term, None)
+                self._dead_postings[term] = self._dead_postings.get(term, 0) + 1
+                affected_terms.add(term)
+
+            if term_freqs:
+                self.deleted_doc_ids[doc_id] = len(term_freqs)
+            self.total_doc_length -= self.doc_lengths[doc_id]
+            self.doc_count -= 1
+            self.corpus[doc_id] = None
+            self.doc_term_freqs[doc_id] = None
+
+        self.avg_doc_length = self.total_doc_length / self.doc_count if self.doc_count > 0 else 0
+
+        for term in affected_terms:
+            if self.doc_freqs[term] == 0 or self._dead_postings[term] > self.compaction_ratio * len(self.postings[term][0]):
+                self._compact_postings(term)
+
+    def _compact_postings(self, term):
+        """
+        Rewrites a term's postings list without its deleted documents, and
+        drops the term entirely once no live document contains it.
+
+        Args:
+            term (str): The term to compact.
+        """
+        deleted = self.deleted_doc_ids
+        doc_ids, tfs = self.postings[term]
+        live_doc_ids, live_tfs = [], []
+        for doc_id, freq in zip(doc_ids, tfs):
+            if doc_id in deleted:
+                # Forget a deleted doc once no postings list references it
+                deleted[doc_id] -= 1
+                if deleted[doc_id] == 0:
+                    del deleted[doc_id]
+            else:
+                live_doc_ids.append(doc_id)
+                live_tfs.append(freq)
+
+        del self._dead_postings[term]
+        if live_doc_ids:
+            self.postings[term] = (live_doc_ids, live_tfs)
+            self.term_upper_bounds[term] = (self._compute_tf_bound(term), self.avg_doc_length)
+        else:
+            del self.postings[term]
+            del self.doc_freqs[term]
+            del self.term_upper_bounds[term]
+            self.idf.pop(term, None)
 
     def get_scores(self, query):
         """
@@ -87,31 +935,36 @@ class BM25Okapi:
             query (str): The search query.
 
         Returns:
-            list of float: A list of BM25 scores, one for each document.
+            list of float: A list of BM25 scores, one for each document
+            (removed documents score 0).
         """
-        query_tokens = self._tokenize(query)
-        scores = [0] * self.doc_count
+        query_tokens = self._tokenize_query(query)
+        scores = [0.0] * len(self.corpus)
+        k1_plus_1 = self.k1 + 1
+        norm_base, norm_scale = self._length_norm_params()
+        doc_lengths = self.doc_lengths
+
+        # Only walk the postings of the query terms, so documents that share
+        # no term with the query are never touched
+        for term in query_tokens:
+            if term not in self.postings:
+                continue
+
+            idf = self._get_idf(term)
+            doc_ids, tfs = self.postings[term]
+
+            if term in self._dead_postings:
+                # Slower path that skips removed documents not yet compacted away
+                deleted = self.deleted_doc_ids
+                for doc_id, freq in zip(doc_ids, tfs):
+                    if doc_id not in deleted:
+                        scores[doc_id] += idf * (freq * k1_plus_1) / (freq + (norm_base + norm_scale * doc_lengths[doc_id]))
+                continue
+
+            for doc_id, freq in zip(doc_ids, tfs):
+                # Calculate the term frequency component of BM25 and combine with IDF
+                scores[doc_id] += idf * (freq * k1_plus_1) / (freq + (norm_base + norm_scale * doc_lengths[doc_id]))
 
-        for i in range(self.doc_count):
-            score = 0
-            doc_len = self.doc_lengths[i]
-            term_freqs = self.doc_term_freqs[i]
-            
-            for term in query_tokens:
-                if term not in term_freqs:
-                    continue
-                
-                freq = term_freqs[term]
-                
-                # Calculate the term frequency component of BM25
-                numerator = freq * (self.k1 + 1)
-                denominator = freq + self.k1 * (1 - self.b + self.b * (doc_len / self.avg_doc_length))
-                
-                # Combine with IDF to get the score for this term
-                score += self.idf.get(term, 0) * (numerator / denominator)
-            
-            scores[i] = score
-            
         return scores
 
     def get_top_n(self, query, n=5):
@@ -125,15 +978,735 @@ class BM25Okapi:
         Returns:
             list of tuple: A list of (document, score) tuples for the top n documents.
         """
-        scores = self.get_scores(query)
-        
-        # Pair scores with their corresponding documents
-        doc_scores = list(zip(self.corpus, scores))
-        
-        # Sort documents by score in descending order
-        doc_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        return doc_scores[:n]
+        query_tokens = self._tokenize_query(query)
+        if n <= 0:
+            return []
+
+        return self._finish_top_n(self._max_score_top_n(query_tokens, n), n)
+
+    def get_top_n_batch(self, queries, n=5, n_jobs=1):
+        """
+        Gets the top n most relevant documents for each of many queries.
+
+        All queries are tokenized up front and queries that tokenize to the
+        same terms are answered once. Results are identical to calling
+        get_top_n on each query.
+
+        Args:
+            queries (list of str): The search queries.
+            n (int, optional): The number of top documents per query. Defaults to 5.
+            n_jobs (int, optional): Worker processes to spread the queries
+                over. None uses every CPU. Defaults to 1 (this process).
+                Workers memory-map the index file; an in-memory index is
+                saved to a temporary file for them first. The workers
+                are kept for later calls with the same n_jobs until the
+                index changes or close_query_pool() is called.
+
+        Returns:
+            list of list: For each query, a list of (document, score) tuples.
+        """
+        n_jobs = n_jobs if n_jobs is not None else os.cpu_count()
+        if n <= 0:
+            return [[] for _ in queries]
+
+        if n_jobs > 1 and len(queries) > 1:
+            chunk_size = -(-len(queries) // n_jobs)
+            chunks = [queries[start:start + chunk_size] for start in range(0, len(queries), chunk_size)]
+            results = self._query_pool(n_jobs).map(_query_chunk, [(chunk, n) for chunk in chunks])
+            return [top for chunk_results in results for top in chunk_results]
+
+        answers = {}
+        results = []
+        for query in queries:
+            query_tokens = tuple(self._tokenize_query(query))
+            if query_tokens not in answers:
+                answers[query_tokens] = self._pad_top_n(self._max_score_top_n(query_tokens, n), n)
+            results.append([(self.corpus[doc_id], score) for score, doc_id in answers[query_tokens]])
+        return results
+
+    def _query_pool(self, n_jobs):
+        """
+        Returns this index's query worker pool, starting one with n_jobs
+        workers if none is running or it has a different size.
+
+        Workers memory-map the index file. An in-memory index is first saved
+        to a temporary file, so neither the pool nor the parent process keeps
+        a serialized copy of it.
+        """
+        pool = _query_pools.get(self)
+        if pool is None:
+            # One finalizer per index; it shuts down whichever pool is current
+            pool = _query_pools[self] = {"n_jobs": None, "executor": None, "temp_dir": None}
+            weakref.finalize(self, _shutdown_query_pool, pool, False)
+        elif pool["executor"] is not None and pool["n_jobs"] == n_jobs:
+            return pool["executor"]
+
+        self.close_query_pool()
+        if self._index_file is not None:
+            index_path = self._index_file.path
+        else:
+            pool["temp_dir"] = tempfile.mkdtemp(prefix="bm25-query-pool-")
+            index_path = os.path.join(pool["temp_dir"], "index.bm25")
+            self.save(index_path)
+        pool["n_jobs"] = n_jobs
+        pool["executor"] = ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_query_worker,
+            initargs=(type(self), index_path, self.analyzer),
+        )
+        return pool["executor"]
+
+    def close_query_pool(self):
+        """Shuts down the worker processes kept by get_top_n_batch, if any."""
+        pool = _query_pools.get(self)
+        if pool is not None:
+            _shutdown_query_pool(pool)
+
+    def _finish_top_n(self, top, n):
+        """
+        Turns (score, doc_id) pairs into (document, score) results.
+
+        Args:
+            top (list of tuple): (score, doc_id) pairs from _max_score_top_n.
+            n (int): The number of documents requested.
+
+        Returns:
+            list of tuple: A list of (document, score) tuples.
+        """
+        return [(self.corpus[doc_id], score) for score, doc_id in self._pad_top_n(top, n)]
+
+    def _pad_top_n(self, top, n):
+        """
+        Pads (score, doc_id) pairs from _max_score_top_n to n results.
+
+        Args:
+            top (list of tuple): (score, doc_id) pairs sorted by descending score.
+            n (int): The number of documents requested.
+
+        Returns:
+            list of tuple: (score, doc_id) pairs.
+        """
+        # Like a full sort, pad with zero-score documents in corpus order
+        # when fewer than n documents match the query
+        if len(top) < n:
+            matched = {doc_id for _, doc_id in top}
+            for doc_id in range(len(self.corpus)):
+                if len(top) >= n:
+                    break
+                if doc_id not in matched and self.corpus[doc_id] is not None:
+                    top.append((0.0, doc_id))
+
+        return top
+
+    def _max_score_top_n(self, query_tokens, n):
+        """
+        Finds the top n documents with MaxScore dynamic pruning.
+
+        Terms are ordered by their score upper bound. Once the heap holds n
+        documents, the lowest-bound terms whose bounds cannot lift a document
+        above the current n-th score become non-essential: candidates are only
+        drawn from the postings of the essential terms, and non-essential
+        postings are probed (by binary search) only while the document can
+        still make it into the heap. Results are identical to sorting the
+        output of get_scores, including ties (lower document id first).
+
+        Args:
+            query_tokens (list of str): The tokenized query.
+            n (int): The number of documents to return.
+
+        Returns:
+            list of tuple: (score, doc_id) pairs sorted by descending score.
+        """
+        query_term_counts = Counter(token for token in query_tokens if token in self.postings)
+        if not query_term_counts:
+            return []
+
+        k1_plus_1 = self.k1 + 1
+        norm_base, norm_scale = self._length_norm_params()
+        doc_lengths = self.doc_lengths
+        deleted = self.deleted_doc_ids
+        end_of_postings = len(self.corpus)
+
+        # Per query term: bound (weighted by repeats in the query), postings and cursor
+        weighted_bounds = {
+            term: self._term_upper_bound(term) * count for term, count in query_term_counts.items()
+        }
+        terms = sorted(query_term_counts, key=weighted_bounds.get)
+        idfs = [self._get_idf(term) for term in terms]
+        postings = [self.postings[term] for term in terms]
+        cursors = [0] * len(terms)
+
+        # prefix_bounds[i] is the most terms[0..i] can add together. The small
+        # slack keeps pruning safe from floating-point rounding
+        prefix_bounds = []
+        running = 0.0
+        for term in terms:
+            running += weighted_bounds[term]
+            prefix_bounds.append(running * (1 + 1e-9))
+
+        # Min-heap of (score, -doc_id), so the root is the weakest kept document
+        heap = []
+        threshold = -math.inf
+        first_essential = 0
+
+        while True:
+            # The next candidate is the smallest unvisited doc in any essential list
+            candidate = end_of_postings
+            for i in range(first_essential, len(terms)):
+                doc_ids = postings[i][0]
+                if cursors[i] < len(doc_ids) and doc_ids[cursors[i]] < candidate:
+                    candidate = doc_ids[cursors[i]]
+            if candidate == end_of_postings:
+                break
+
+            contributions = {}
+            norm = norm_base + norm_scale * doc_lengths[candidate]
+            # Essential terms: the candidate is at their cursor or they skip it
+            for i in range(first_essential, len(terms)):
+                doc_ids, tfs = postings[i]
+                if cursors[i] < len(doc_ids) and doc_ids[cursors[i]] == candidate:
+                    freq = tfs[cursors[i]]
+                    contributions[terms[i]] = idfs[i] * (freq * k1_plus_1) / (freq + norm)
+                    cursors[i] += 1
+
+            if candidate in deleted:
+                continue
+
+            # Non-essential terms, highest bound first, while the doc can still qualify
+            partial = sum(contributions[term] * query_term_counts[term] for term in contributions)
+            for i in range(first_essential - 1, -1, -1):
+                if partial + prefix_bounds[i] <= threshold:
+                    break
+                doc_ids, tfs = postings[i]
+                cursors[i] = bisect_left(doc_ids, candidate, cursors[i])
+                if cursors[i] < len(doc_ids) and doc_ids[cursors[i]] == candidate:
+                    freq = tfs[cursors[i]]
+                    contribution = idfs[i] * (freq * k1_plus_1) / (freq + norm)
+                    contributions[terms[i]] = contribution
+                    partial += contribution * query_term_counts[terms[i]]
+            else:
+                # Fully scored: sum in query order so the float matches get_scores
+                score = 0.0
+                for token in query_tokens:
+                    if token in contributions:
+                        score += contributions[token]
+
+                # Doc ids only grow, so an equal score never displaces a kept doc
+                if len(heap) < n:
+                    heapq.heappush(heap, (score, -candidate))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, -candidate))
+                else:
+                    continue
+
+                if len(heap) == n:
+                    threshold = heap[0][0]
+                    while first_essential < len(terms) and prefix_bounds[first_essential] <= threshold:
+                        first_essential += 1
+
+        return [(score, -neg_doc_id) for score, neg_doc_id in sorted(heap, key=lambda x: (-x[0], -x[1]))]
+
+class BM25Sparse(_BM25Base):
+    """
+    BM25 backend that stores the corpus as a CSR term-document matrix.
+
+    Each non-zero entry already holds the full BM25 weight of a term in a
+    document (IDF times saturated term frequency, with length normalization
+    applied at index time), so scoring a query is a sparse row-sum and no
+    per-document Python dictionaries are kept. Requires NumPy and SciPy.
+
+    Besides Okapi BM25 the index can score with BM25L, BM25+ and the
+    field-weighted BM25F. All variants share the matrix structure (the
+    postings and the length tables); each one only adds its own array of
+    precomputed weights, so switching ranking functions at query time
+    costs no extra indexing or per-query math.
+
+    The matrix is immutable and not persisted; build a new BM25Sparse to
+    change the corpus, or use BM25Okapi for updates and save() / load().
+    """
+
+    VARIANTS = ('okapi', 'bm25l', 'bm25+', 'bm25f')
+
+    def __init__(self, corpus, k1=1.5, b=0.75, analyzer=None, variants=('okapi',), delta_l=0.5,
+                 delta_plus=1.0, field_weights=None, field_b=None):
+        """
+        Initializes the sparse BM25 model.
+
+        Args:
+            corpus (list of str or dict): A list of documents to be indexed.
+                With field_weights, each document is a dict of field -> text.
+            k1 (float, optional): BM25 parameter. Defaults to 1.5.
+            b (float, optional): BM25 parameter. Defaults to 0.75.
+            analyzer (Analyzer, optional): Turns documents and queries into
+                terms. Defaults to Analyzer().
+            variants (tuple of str, optional): Ranking functions to precompute
+                weights for, from VARIANTS. Defaults to ('okapi',).
+            delta_l (float, optional): BM25L shift of the normalized term
+                frequency. Defaults to 0.5.
+            delta_plus (float, optional): BM25+ lower bound added for every
+                matching term. Defaults to 1.0.
+            field_weights (dict, optional): Field -> weight for BM25F, e.g.
+                {'title': 2.0, 'body': 1.0}. Required for 'bm25f'.
+            field_b (dict, optional): Field -> length normalization for BM25F.
+                Fields not listed use b.
+        """
+        if np is None or sparse is None:
+            raise ImportError("BM25Sparse requires numpy and scipy to be installed")
+        unknown = set(variants) - set(self.VARIANTS)
+        if unknown:
+            raise ValueError(f"Unknown BM25 variants: {sorted(unknown)}")
+        if 'bm25f' in variants and not field_weights:
+            raise ValueError("The 'bm25f' variant needs field_weights")
+
+        self.variants = tuple(variants)
+        self.delta_l = delta_l
+        self.delta_plus = delta_plus
+        self.field_weights = dict(field_weights) if field_weights else None
+        self.field_b = dict(field_b) if field_b else {}
+        # Rows are term ids (see vocab), columns are documents, values are Okapi BM25 weights
+        self.term_doc_matrix = None
+        # Variant -> weights aligned with term_doc_matrix.data
+        self.variant_weights = {}
+        super().__init__(corpus, k1=k1, b=b, analyzer=analyzer)
+        self.doc_lengths = None
+        self.avg_doc_length = 0
+        self.idf = None
+        self.doc_len_norms = None
+        self._initialize()
+
+    def _initialize(self):
+        """
+        Tokenizes the corpus into COO triplets and converts them into a CSR
+        matrix of precomputed BM25 weights, plus one weight array per
+        additional variant.
+        """
+        fields = list(self.field_weights) if self.field_weights else None
+
+        # Compact typed buffers instead of per-document dictionaries
+        rows = array('i')
+        cols = array('i')
+        freqs = array('f')
+        doc_lengths = array('i')
+        field_freqs = {field: array('f') for field in fields or ()}
+        field_lengths = {field: array('i') for field in fields or ()}
+
+        for doc_id, doc in enumerate(self.corpus):
+            if fields is None:
+                tokens = self._tokenize(doc)
+                field_counts = {}
+            else:
+                # The whole document is the concatenation of its fields
+                field_tokens = {field: self._tokenize(doc.get(field, '')) for field in fields}
+                tokens = [token for field in fields for token in field_tokens[field]]
+                field_counts = {field: Counter(field_tokens[field]) for field in fields}
+                for field in fields:
+                    field_lengths[field].append(len(field_tokens[field]))
+
+            doc_lengths.append(len(tokens))
+            for token, freq in Counter(tokens).items():
+                term_id = self._term_id(token)
+                rows.append(term_id)
+                cols.append(doc_id)
+                freqs.append(freq)
+                for field, counts in field_counts.items():
+                    field_freqs[field].append(counts.get(token, 0))
+
+        rows = np.frombuffer(rows, dtype=np.int32)
+        cols = np.frombuffer(cols, dtype=np.int32)
+        freqs = np.frombuffer(freqs, dtype=np.float32)
+        self.doc_lengths = np.frombuffer(doc_lengths, dtype=np.int32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.doc_count > 0 else 0
+
+        # Each (term, doc) pair appears once, so the row counts are the document frequencies
+        df = np.bincount(rows, minlength=len(self.vocab)).astype(np.float64)
+        self.idf = np.log((self.doc_count - df + 0.5) / (df + 0.5) + 1.0).astype(np.float32)
+
+        relative_len = self.doc_lengths / self.avg_doc_length if self.avg_doc_length > 0 else np.zeros(self.doc_count)
+        self.doc_len_norms = (self.k1 * (1 - self.b + self.b * relative_len)).astype(np.float32)
+
+        # Put the entries in CSR (term-major) order once; every variant's
+        # weights are computed in that order and share indptr / indices
+        order = np.lexsort((cols, rows))
+        rows, cols, freqs = rows[order], cols[order], freqs[order]
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int32)
+        indptr[1:] = np.cumsum(df)
+
+        # Full BM25 weight of each (term, doc) entry
+        weights = self.idf[rows] * (freqs * (self.k1 + 1)) / (freqs + self.doc_len_norms[cols])
+
+        self.term_doc_matrix = sparse.csr_matrix(
+            (weights.astype(np.float32), cols, indptr),
+            shape=(len(self.vocab), self.doc_count),
+        )
+        self.variant_weights['okapi'] = self.term_doc_matrix.data
+
+        length_norm = (1 - self.b + self.b * relative_len)[cols]
+        if 'bm25l' in self.variants:
+            # BM25L: shift the length-normalized tf so long documents are not over-penalized
+            idf_l = np.log((self.doc_count + 1) / (df + 0.5))
+            ctd = freqs / length_norm + self.delta_l
+            self.variant_weights['bm25l'] = (idf_l[rows] * (self.k1 + 1) * ctd / (self.k1 + ctd)).astype(np.float32)
+
+        if 'bm25+' in self.variants:
+            # BM25+: every matching term contributes at least idf * delta_plus
+            idf_plus = np.log((self.doc_count + 1) / df)
+            saturated = (freqs * (self.k1 + 1)) / (freqs + self.k1 * length_norm)
+            self.variant_weights['bm25+'] = (idf_plus[rows] * (saturated + self.delta_plus)).astype(np.float32)
+
+        if 'bm25f' in self.variants:
+            # BM25F: combine per-field length-normalized tf into one pseudo-tf, then saturate once
+            pseudo_freqs = np.zeros(len(freqs), dtype=np.float64)
+            for field in fields:
+                lengths = np.frombuffer(field_lengths[field], dtype=np.int32)
+                avg_length = lengths.mean() if self.doc_count > 0 else 0
+                field_relative_len = lengths / avg_length if avg_length > 0 else np.zeros(self.doc_count)
+                b = self.field_b.get(field, self.b)
+                field_norm = (1 - b + b * field_relative_len)[cols]
+                field_tf = np.frombuffer(field_freqs[field], dtype=np.float32)[order]
+                # An empty field with b = 1 has norm 0 and tf 0; it contributes nothing rather than 0/0
+                pseudo_freqs += self.field_weights[field] * np.divide(
+                    field_tf, field_norm, out=np.zeros(len(field_tf), dtype=np.float64), where=field_norm > 0)
+            self.variant_weights['bm25f'] = (
+                self.idf[rows] * pseudo_freqs * (self.k1 + 1) / (self.k1 + pseudo_freqs)
+            ).astype(np.float32)
+
+    def get_scores(self, query, variant='okapi'):
+        """
+        Calculates the BM25 scores for a given query against all documents.
+
+        Args:
+            query (str): The search query.
+            variant (str, optional): Ranking function, one of the variants
+                the index was built with. Defaults to 'okapi'.
+
+        Returns:
+            numpy.ndarray: A float32 array of BM25 scores, one for each document.
+        """
+        if variant not in self.variant_weights:
+            raise ValueError(f"Variant {variant!r} was not precomputed; built with {self.variants}")
+
+        matrix = self.term_doc_matrix
+        weights = self.variant_weights[variant]
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+
+        # Sum the CSR rows of the query terms. Repeated query terms add their
+        # row twice, matching BM25Okapi
+        for token in self._tokenize_query(query):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = matrix.indptr[term_id], matrix.indptr[term_id + 1]
+            scores[matrix.indices[start:end]] += weights[start:end]
+
+        return scores
+
+    def get_top_n(self, query, n=5, variant='okapi'):
+        """
+        Gets the top n most relevant documents for a query.
+
+        Args:
+            query (str): The search query.
+            n (int, optional): The number of top documents to return. Defaults to 5.
+            variant (str, optional): Ranking function. Defaults to 'okapi'.
+
+        Returns:
+            list of tuple: A list of (document, score) tuples for the top n documents.
+        """
+        scores = self.get_scores(query, variant=variant)
+        n = min(n, self.doc_count)
+        if n <= 0:
+            return []
+
+        # Partial selection finds the n-th best score; every document tied
+        # with it is kept so ties can be broken by doc id, as a stable full
+        # sort (and BM25Okapi) would
+        cutoff = scores[np.argpartition(-scores, n - 1)[n - 1]]
+        candidates = np.flatnonzero(scores >= cutoff)
+        top = candidates[np.lexsort((candidates, -scores[candidates]))[:n]]
+        return [(self.corpus[i], float(scores[i])) for i in top]
+
+    def get_top_n_batch(self, queries, n=5, variant='okapi'):
+        """
+        Gets the top n most relevant documents for each of many queries.
+
+        Scoring is already vectorized per query, so queries run in turn.
+
+        Returns:
+            list of list: For each query, a list of (document, score) tuples.
+        """
+        return [self.get_top_n(query, n, variant=variant) for query in queries]
+
+class _BM25Shard(BM25Okapi):
+    """
+    One partition of a ShardedBM25 index, living in its own worker process.
+
+    Queries are scored with collection-wide statistics sent by the
+    coordinator (document count, average length and the doc frequencies of
+    the query terms) instead of the shard's own, so every shard ranks
+    exactly as a single index over the whole corpus would.
+    """
+
+    def __init__(self, corpus, k1=1.5, b=0.75, analyzer=None):
+        # Global doc frequencies of the current query's terms, while it runs
+        self._global_doc_count = None
+        self._global_doc_freqs = None
+        super().__init__(corpus, k1=k1, b=b, analyzer=analyzer)
+
+    def _get_idf(self, term):
+        if self._global_doc_freqs is None:
+            return super()._get_idf(term)
+        return self._idf_formula(self._global_doc_count, self._global_doc_freqs[term])
+
+    def top_n_with_global_stats(self, query_tokens, n, doc_count, avg_doc_length, doc_freqs):
+        """
+        Finds this shard's top n documents using collection-wide statistics.
+
+        Args:
+            query_tokens (tuple of str): The analyzed query.
+            n (int): The number of documents to return.
+            doc_count (int): Live documents across all shards.
+            avg_doc_length (float): Average document length across all shards.
+            doc_freqs (dict): Term -> doc frequency across all shards, for the query terms.
+
+        Returns:
+            list of tuple: (score, local doc id, document) triples.
+        """
+        local_avg_doc_length = self.avg_doc_length
+        self._global_doc_count, self._global_doc_freqs = doc_count, doc_freqs
+        self.avg_doc_length = avg_doc_length
+        try:
+            top = self._pad_top_n(self._max_score_top_n(query_tokens, n), n)
+        finally:
+            self._global_doc_count = self._global_doc_freqs = None
+            self.avg_doc_length = local_avg_doc_length
+        return [(score, doc_id, self.corpus[doc_id]) for score, doc_id in top]
+
+    def stats(self):
+        """Returns (live doc count, total doc length, {term: doc frequency})."""
+        return self.doc_count, self.total_doc_length, dict(self.doc_freqs)
+
+def _shard_worker_main(conn, corpus, k1, b, analyzer):
+    """
+    Command loop of a ShardedBM25 worker process.
+
+    Builds the shard, then answers (command, args) messages from the
+    coordinator with (ok, result) replies until it receives 'close'.
+    """
+    shard = _BM25Shard(corpus, k1=k1, b=b, analyzer=analyzer)
+    del corpus
+    conn.send((True, shard.stats()))
+
+    while True:
+        command, args = conn.recv()
+        if command == 'close':
+            conn.close()
+            return
+        try:
+            if command == 'top_n':
+                result = shard.top_n_with_global_stats(*args)
+            elif command == 'add':
+                # Doc frequency changes are reported so the coordinator's global stats stay exact
+                doc_ids = shard.add_documents(args)
+                result = (
+                    sum(shard.doc_lengths[doc_id] for doc_id in doc_ids),
+                    Counter(term for doc_id in doc_ids for term in shard._doc_terms(doc_id)),
+                )
+            elif command == 'remove':
+                # Repeated ids must only be counted once, as remove_documents skips them
+                doc_ids = [doc_id for doc_id in dict.fromkeys(args) if shard.corpus[doc_id] is not None]
+                removed_terms = Counter(term for doc_id in doc_ids for term in shard._doc_terms(doc_id))
+                removed_length = sum(shard.doc_lengths[doc_id] for doc_id in doc_ids)
+                shard.remove_documents(doc_ids)
+                result = (len(doc_ids), removed_length, removed_terms)
+            else:
+                raise ValueError(f"Unknown shard command: {command}")
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, e))
+
+class ShardedBM25:
+    """
+    BM25 index partitioned across worker processes, queried by scatter-gather.
+
+    Documents are assigned to shards round-robin (global id g lives in shard
+    g % n_shards as local id g // n_shards), so each shard holds a fraction
+    of the corpus and the index can exceed one process's memory. The
+    coordinator keeps only the collection-wide statistics (document count,
+    total length and per-term document frequencies). For each query it
+    sends the statistics of the query terms to every shard, the shards
+    search in parallel, and their top n lists are merged. Results are
+    identical to a single BM25Okapi over the whole corpus.
+    """
+
+    def __init__(self, corpus, n_shards=None, k1=1.5, b=0.75, analyzer=None):
+        """
+        Builds the shards, one worker process each, in parallel.
+
+        Args:
+            corpus (list of str): A list of documents to be indexed.
+            n_shards (int, optional): Number of shards / worker processes.
+                Defaults to the number of CPUs.
+            k1 (float, optional): BM25 parameter. Defaults to 1.5.
+            b (float, optional): BM25 parameter. Defaults to 0.75.
+            analyzer (Analyzer, optional): Turns documents and queries into
+                terms. Defaults to Analyzer().
+        """
+        self.n_shards = n_shards if n_shards is not None else os.cpu_count()
+        self.analyzer = analyzer if analyzer is not None else Analyzer()
+        self.slot_count = len(corpus)
+        self.doc_count = 0
+        self.total_doc_length = 0
+        self.doc_freqs = Counter()
+        self._connections = []
+        self._processes = []
+
+        context = multiprocessing.get_context()
+        for shard_id in range(self.n_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_worker_main,
+                args=(child_conn, corpus[shard_id::self.n_shards], k1, b, self.analyzer),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+
+        for doc_count, total_doc_length, doc_freqs in self._gather():
+            self.doc_count += doc_count
+            self.total_doc_length += total_doc_length
+            self.doc_freqs.update(doc_freqs)
+
+    @property
+    def avg_doc_length(self):
+        return self.total_doc_length / self.doc_count if self.doc_count > 0 else 0
+
+    def _gather(self):
+        """Collects one reply from every shard, raising the first shard error."""
+        replies = self._gather_replies()
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def _gather_replies(self):
+        """Collects one (ok, result) reply from every shard."""
+        return [conn.recv() for conn in self._connections]
+
+    @staticmethod
+    def _raise_first_error(replies):
+        for ok, result in replies:
+            if not ok:
+                raise result
+
+    def _scatter(self, messages):
+        """Sends one (command, args) message per shard, then gathers the replies."""
+        for conn, message in zip(self._connections, messages):
+            conn.send(message)
+        return self._gather()
+
+    def get_top_n(self, query, n=5):
+        """
+        Gets the top n most relevant documents for a query across all shards.
+
+        Args:
+            query (str): The search query.
+            n (int, optional): The number of top documents to return. Defaults to 5.
+
+        Returns:
+            list of tuple: A list of (document, score) tuples for the top n documents.
+        """
+        if n <= 0:
+            return []
+
+        query_tokens = self.analyzer.analyze_query(query)
+        doc_freqs = {term: self.doc_freqs[term] for term in set(query_tokens) if self.doc_freqs.get(term)}
+        args = (query_tokens, n, self.doc_count, self.avg_doc_length, doc_freqs)
+        shard_results = self._scatter([('top_n', args)] * self.n_shards)
+
+        # Each shard list is sorted by (score desc, local id asc); local ids
+        # preserve global order, so a heap merge gives the global ranking
+        merged = heapq.merge(*(
+            [(-score, local_id * self.n_shards + shard_id, doc) for score, local_id, doc in results]
+            for shard_id, results in enumerate(shard_results)
+        ))
+        return [(doc, -neg_score) for neg_score, _, doc in itertools.islice(merged, n)]
+
+    def add_documents(self, documents):
+        """
+        Adds documents, continuing the round-robin assignment to shards.
+
+        Args:
+            documents (list of str): The documents to add.
+
+        Returns:
+            list of int: The global ids assigned to the new documents.
+        """
+        new_doc_ids = list(range(self.slot_count, self.slot_count + len(documents)))
+        per_shard = [[] for _ in range(self.n_shards)]
+        for doc_id, doc in zip(new_doc_ids, documents):
+            per_shard[doc_id % self.n_shards].append(doc)
+        self.slot_count += len(documents)
+
+        for conn, docs in zip(self._connections, per_shard):
+            conn.send(('add', docs))
+        # Shards that succeeded keep their documents, so account for them before raising
+        replies = self._gather_replies()
+        for (ok, result), docs in zip(replies, per_shard):
+            if ok:
+                added_length, added_terms = result
+                self.doc_count += len(docs)
+                self.total_doc_length += added_length
+                self.doc_freqs.update(added_terms)
+        self._raise_first_error(replies)
+        return new_doc_ids
+
+    def remove_documents(self, doc_ids):
+        """
+        Removes documents by global id.
+
+        Args:
+            doc_ids (list of int): Global ids of the documents to remove.
+        """
+        # Validate every id first so a bad one cannot fail some shards after others removed theirs
+        doc_ids = list(dict.fromkeys(doc_ids))
+        for doc_id in doc_ids:
+            if not 0 <= doc_id < self.slot_count:
+                raise IndexError(f"Document id {doc_id} out of range")
+
+        per_shard = [[] for _ in range(self.n_shards)]
+        for doc_id in doc_ids:
+            per_shard[doc_id % self.n_shards].append(doc_id // self.n_shards)
+
+        for conn, ids in zip(self._connections, per_shard):
+            conn.send(('remove', ids))
+        # Apply the shards that succeeded even if another one failed
+        replies = self._gather_replies()
+        for ok, result in replies:
+            if ok:
+                removed_count, removed_length, removed_terms = result
+                self.doc_count -= removed_count
+                self.total_doc_length -= removed_length
+                self.doc_freqs.subtract(removed_terms)
+        # Drop terms no live document contains any more
+        self.doc_freqs = +self.doc_freqs
+        self._raise_first_error(replies)
+
+    def close(self):
+        """Stops the shard worker processes."""
+        for conn in self._connections:
+            conn.send(('close', None))
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 # --- Example Usage ---
 if __name__ == '__main__':
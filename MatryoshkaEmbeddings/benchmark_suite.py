@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from embedding_matrix import EmbeddingMatrix
+from quantized_store import QuantizedStore, top_rows
+
+def synthetic_corpus(n_docs: int, dim: int = 768, n_clusters: int = 200, seed: int = 0):
+    """
+    Generates clustered embeddings whose variance decays with the dimension
+    index, so, as with Matryoshka-trained models, leading dimensions carry
+    most of the signal.
+
+    Returns:
+        tuple: (ids, float32 embeddings of shape (n_docs, dim)).
+    """
+    rng = np.random.default_rng(seed)
+    scale = (1.0 / np.sqrt(1.0 + np.arange(dim) / 32.0)).astype(np.float32)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32) * scale
+    assignments = rng.integers(0, n_clusters, n_docs)
+    embs = centers[assignments] + rng.standard_normal((n_docs, dim)).astype(np.float32) * scale
+    return [f"doc_{i}" for i in range(n_docs)], embs
+
+def synthetic_queries(embs, n_queries: int, seed: int = 1):
+    """Queries are noisy copies of random documents."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(embs), n_queries)
+    noise = 0.5 * rng.standard_normal((n_queries, embs.shape[1])).astype(np.float32) * embs.std(axis=0)
+    return embs[picks] + noise
+
+def summarize(samples_ns, n_bootstrap: int = 2000, seed: int = 0):
+    """
+    Summary statistics of latency samples, in milliseconds.
+
+    The 95% confidence interval of the mean is a percentile bootstrap, so
+    it does not assume normally distributed latencies.
+    """
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    if len(samples) == 0:
+        return None
+    rng = np.random.default_rng(seed)
+    means = rng.choice(samples, size=(n_bootstrap, len(samples)), replace=True).mean(axis=1)
+    low, high = np.percentile(means, [2.5, 97.5])
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        "n": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 4),
+        "ci95_ms": [round(float(low), 4), round(float(high), 4)],
+        "std_ms": round(float(samples.std(ddof=1)) if len(samples) > 1 else 0.0, 4),
+        "p50_ms": round(float(p50), 4),
+        "p90_ms": round(float(p90), 4),
+        "p99_ms": round(float(p99), 4),
+        "min_ms": round(float(samples.min()), 4),
+    }
+
+def recall_at_k(found_ids, exact_ids):
+    return len(set(found_ids) & set(exact_ids)) / len(exact_ids) if exact_ids else 0.0
+
+class PrefixIndex:
+    """
+    Exact inner-product search over normalized prefixes of the embeddings,
+    an offline stand-in for a low-dimension ANN tier.
+    """
+
+    def __init__(self, ids, embs, dim: int):
+        prefix = embs[:, :dim]
+        self.ids = ids
+        self.dim = dim
+        self.vectors = prefix / np.maximum(np.linalg.norm(prefix, axis=1, keepdims=True), 1e-12)
+
+    def search(self, query, k: int):
+        return [self.ids[row] for row in top_rows(self.vectors @ query[:self.dim], k)]
+
+def run_pipeline(first_stage, matrix, queries, exact, top_k: int, candidate_pool: int, warmup: int, runs: int):
+    """
+    Times a two-stage pipeline (first-stage candidates, then float rescoring)
+    per stage with perf_counter_ns, after warm-up passes that are discarded.
+
+    Returns:
+        dict: Per-stage and total latency summaries, plus mean recall@k.
+    """
+    for query in queries[:warmup]:
+        matrix.rescore(first_stage(query, candidate_pool), query, top_k)
+
+    first_ns, rescore_ns, total_ns, recalls = [], [], [], []
+    for _ in range(runs):
+        for query, exact_ids in zip(queries, exact):
+            t0 = time.perf_counter_ns()
+            candidates = first_stage(query, candidate_pool)
+            t1 = time.perf_counter_ns()
+            found = matrix.rescore(candidates, query, top_k)
+            t2 = time.perf_counter_ns()
+            first_ns.append(t1 - t0)
+            rescore_ns.append(t2 - t1)
+            total_ns.append(t2 - t0)
+            recalls.append(recall_at_k([doc_id for doc_id, _ in found], exact_ids))
+
+    return {
+        "first_stage": summarize(first_ns),
+        "rescore": summarize(rescore_ns),
+        "total": summarize(total_ns),
+        f"recall_at_{top_k}": round(float(np.mean(recalls)), 4),
+    }
+
+def time_encoder(model_name: str, n_queries: int, warmup: int, runs: int):
+    """Times single-query encoding with a SentenceTransformer model (needs the model available locally)."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, trust_remote_code=True)
+    texts = [f"search_query: synthetic benchmark query number {i}" for i in range(n_queries)]
+    for text in texts[:warmup]:
+        model.encode(text)
+    samples = []
+    for _ in range(runs):
+        for text in texts:
+            t0 = time.perf_counter_ns()
+            model.encode(text)
+            samples.append(time.perf_counter_ns() - t0)
+    return summarize(samples)
+
+def environment():
+    """Metadata that makes results comparable across commits and machines."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "git_commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def compare(previous, current):
+    """Prints the change in p50 total latency and recall for pipelines present in both results."""
+    before = {r["pipeline"]: r for r in previous["results"]}
+    print(f"\nvs {previous['environment'].get('git_commit')}:")
+    for result in current["results"]:
+        old = before.get(result["pipeline"])
+        if old is None:
+            continue
+        old_p50, new_p50 = old["total"]["p50_ms"], result["total"]["p50_ms"]
+        change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0.0
+        recall_key = next(key for key in result if key.startswith("recall_at_"))
+        print(f"  {result['pipeline']:>10}: p50 {old_p50:8.3f} -> {new_p50:8.3f} ms ({change:+6.1f}%)"
+              f"  recall {old.get(recall_key, 0):.3f} -> {result[recall_key]:.3f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of Matryoshka retrieval pipelines")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--candidate-pool", type=int, default=100)
+    parser.add_argument("--tiers", default="64,128,256")
+    parser.add_argument("--warmup", type=int, default=10, help="discarded queries before timing each pipeline")
+    parser.add_argument("--runs", type=int, default=3, help="passes over the query set per pipeline")
+    parser.add_argument("--model", help="also time query encoding with this SentenceTransformer model")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier JSON output to compare against")
+    args = parser.parse_args(argv)
+
+    ids, embs = synthetic_corpus(args.docs, args.dim)
+    queries = synthetic_queries(embs, args.queries)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        matrix = EmbeddingMatrix(os.path.join(workdir, "matrix"))
+        matrix.add(ids, embs)
+        quantized = QuantizedStore(os.path.join(workdir, "quantized"))
+        quantized.build(ids, embs)
+
+        # Exact full-dimension cosine top k is the recall reference
+        exact = [[doc_id for doc_id, _ in matrix.rescore(ids, query, args.top_k)] for query in queries]
+
+        pipelines = {"full": lambda query, k: ids}
+        for dim in [int(x) for x in args.tiers.split(",")]:
+            pipelines[f"tier_{dim}"] = PrefixIndex(ids, embs, dim).search
+        pipelines["int8"] = quantized.search_int8
+        pipelines["binary"] = quantized.search_binary
+
+        results = []
+        for name, first_stage in pipelines.items():
+            result = run_pipeline(first_stage, matrix, queries, exact, args.top_k, args.candidate_pool,
+                                  args.warmup, args.runs)
+            results.append({"pipeline": name, **result})
+            total = result["total"]
+            print(f"{name:>10}: p50 {total['p50_ms']:8.3f} ms  p99 {total['p99_ms']:8.3f} ms  "
+                  f"mean {total['mean_ms']:8.3f} ms (95% CI {total['ci95_ms'][0]:.3f}-{total['ci95_ms'][1]:.3f})  "
+                  f"recall@{args.top_k} {result[f'recall_at_{args.top_k}']:.3f}")
+
+    report = {
+        "environment": environment(),
+        "config": vars(args),
+        "encode": time_encoder(args.model, min(args.queries, 50), args.warmup, args.runs) if args.model else None,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+class EmbeddingMatrix:
+    """
+    L2-normalized float32 embeddings in a memory-mapped file, one row per id.
+
+    Rows are normalized once when added, so cosine rescoring of a candidate
+    set is a single row gather plus one matrix-vector product, with no list
+    conversion and no per-request norm computation. The file grows by
+    doubling its row capacity; pages are loaded by the OS on demand.
+    """
+
+    def __init__(self, path: str, dim: int = None):
+        """
+        Opens the matrix stored in the directory path, creating it on first add.
+
+        Args:
+            path (str): Directory holding vectors.f32 and ids.json.
+            dim (int, optional): Embedding size. Read from disk if the matrix exists.
+        """
+        self.path = path
+        self.dim = dim
+        self.ids = []
+        self.id_to_row = {}
+        self.size = 0
+        self.vectors = None
+        self._lock = threading.Lock()
+
+        meta_path = os.path.join(path, "ids.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.ids = meta["ids"]
+            self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            self.size = len(self.ids)
+            capacity = os.path.getsize(self._vectors_path) // (4 * self.dim)
+            self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.path, "vectors.f32")
+
+    def _ensure_capacity(self, n_rows):
+        capacity = 0 if self.vectors is None else self.vectors.shape[0]
+        if n_rows <= capacity:
+            return
+        capacity = max(n_rows, 2 * capacity, 1024)
+        if self.vectors is not None:
+            self.vectors.flush()
+        # Extend the file, then remap it at the new size
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def add(self, ids, embs):
+        """Normalizes and stores embeddings, overwriting rows of known ids."""
+        embs = np.asarray(embs, dtype=np.float32)
+        embs = embs / np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            if self.dim is None:
+                self.dim = embs.shape[1]
+            self._ensure_capacity(self.size + len(ids))
+            rows = []
+            for doc_id in ids:
+                row = self.id_to_row.get(doc_id)
+                if row is None:
+                    row = self.size
+                    self.ids.append(doc_id)
+                    self.id_to_row[doc_id] = row
+                    self.size += 1
+                rows.append(row)
+            self.vectors[rows] = embs
+
+    def __contains__(self, doc_id):
+        return doc_id in self.id_to_row
+
+    def gather(self, candidate_ids):
+        """
+        Returns (known ids, their normalized vectors) for the candidates this
+        matrix holds, in candidate order.
+        """
+        known = [doc_id for doc_id in candidate_ids if doc_id in self.id_to_row]
+        rows = np.fromiter((self.id_to_row[doc_id] for doc_id in known), dtype=np.int64, count=len(known))
+        if not known:
+            return known, np.empty((0, self.dim or 0), dtype=np.float32)
+        return known, self.vectors[rows]
+
+    def rescore(self, candidate_ids, query, top_k: int):
+        """
+        Ranks candidates by cosine similarity to the query.
+
+        Args:
+            candidate_ids (list of str): Ids to score; unknown ids are skipped.
+            query (numpy.ndarray): Full-dimension query embedding.
+            top_k (int): Number of results to return.
+
+        Returns:
+            list of tuple: (id, cosine score), best first.
+        """
+        known, vectors = self.gather(candidate_ids)
+        if not known:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        sims = vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        top = np.argsort(-sims, kind="stable")[:top_k]
+        return [(known[i], float(sims[i])) for i in top]
+
+    def flush(self):
+        """Writes pending pages and the id list to disk."""
+        with self._lock:
+            if self.vectors is None:
+                return
+            self.vectors.flush()
+            # Write beside ids.json and rename over it, so a crash mid-write
+            # never leaves a truncated file that stops the next start
+            target = os.path.join(self.path, "ids.json")
+            tmp = target + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"dim": self.dim, "ids": self.ids}, f)
+            os.replace(tmp, target)
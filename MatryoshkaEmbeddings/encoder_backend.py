@@ -0,0 +1,89 @@
+import os
+import platform
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Supported values of the EMBEDDING_BACKEND environment variable
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def default_quantization_config():
+    """Dynamic int8 quantization preset matching this CPU's instruction set."""
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return "arm64"
+    return "avx512_vnni" if "avx512_vnni" in _cpu_flags() else "avx2"
+
+def _cpu_flags():
+    try:
+        with open("/proc/cpuinfo") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def load_encoder(model_name: str, backend: str = None, threads: int = None, export_dir: str = "./onnx_models",
+                 trust_remote_code: bool = False):
+    """
+    Loads a SentenceTransformer on the selected CPU backend.
+
+    "torch" is the original fp32 PyTorch model. "onnx" runs the model with
+    ONNX Runtime. "onnx-int8" additionally quantizes the ONNX graph's
+    weights to int8 (dynamic quantization). The int8 model is exported once
+    into export_dir and reused on later starts.
+
+    Args:
+        model_name (str): Hugging Face model id.
+        backend (str, optional): One of BACKENDS. Defaults to $EMBEDDING_BACKEND or "torch".
+        threads (int, optional): Intra-op threads. Defaults to $EMBEDDING_THREADS,
+            else the runtime's default.
+        export_dir (str, optional): Where exported ONNX models are kept.
+        trust_remote_code (bool, optional): Passed to SentenceTransformer.
+
+    Returns:
+        SentenceTransformer: The model; encode() works the same on every backend.
+    """
+    backend = backend or os.environ.get("EMBEDDING_BACKEND", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+    threads = threads or (int(os.environ["EMBEDDING_THREADS"]) if os.environ.get("EMBEDDING_THREADS") else None)
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name, trust_remote_code=trust_remote_code)
+
+    model_kwargs = {"provider": "CPUExecutionProvider"}
+    if threads:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs["session_options"] = session_options
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs,
+                                   trust_remote_code=trust_remote_code)
+
+    # onnx-int8: export and quantize once, then load the saved int8 graph
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    config = default_quantization_config()
+    local_path = os.path.join(export_dir, model_name.replace("/", "__"))
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    if not os.path.exists(os.path.join(local_path, file_name)):
+        fp32_model = SentenceTransformer(model_name, backend="onnx", trust_remote_code=trust_remote_code)
+        fp32_model.save_pretrained(local_path)
+        export_dynamic_quantized_onnx_model(fp32_model, config, local_path)
+    model_kwargs["file_name"] = file_name
+    return SentenceTransformer(local_path, backend="onnx", model_kwargs=model_kwargs,
+                               trust_remote_code=trust_remote_code)
+
+def max_cosine_deviation(reference, candidate, texts):
+    """
+    Largest 1 - cosine similarity between two models' embeddings of the same
+    texts, used to check a faster backend stays close to the PyTorch one.
+    """
+    a = reference.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    b = candidate.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return float(np.max(1.0 - np.sum(a * b, axis=1)))
@@ -0,0 +1,85 @@
+import argparse
+import json
+import time
+
+from benchmark_suite import environment, summarize
+from encoder_backend import BACKENDS, load_encoder, max_cosine_deviation
+
+SAMPLE_TEXTS = [
+    "search_query: how do matryoshka embeddings work",
+    "search_document: Truncating an embedding keeps its leading dimensions.",
+    "search_query: fastest way to serve sentence embeddings on a cpu",
+    "search_document: ONNX Runtime executes exported transformer graphs.",
+    "search_document: Dynamic quantization stores weights as 8-bit integers.",
+    "search_query: what is approximate nearest neighbour search",
+]
+
+def texts_for(n: int):
+    return [f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} ({i})" for i in range(n)]
+
+def benchmark_backend(model, batch_sizes, n_texts: int, warmup: int, runs: int):
+    """Texts/second per batch size, plus single-query latency statistics."""
+    texts = texts_for(n_texts)
+    model.encode(texts[:warmup * 8], batch_size=8)
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        samples = []
+        for _ in range(runs):
+            t0 = time.perf_counter_ns()
+            model.encode(texts, batch_size=batch_size)
+            samples.append(time.perf_counter_ns() - t0)
+        best = min(samples) / 1e9
+        throughput[batch_size] = round(n_texts / best, 1)
+
+    latencies = []
+    for text in texts[:50]:
+        t0 = time.perf_counter_ns()
+        model.encode(text)
+        latencies.append(time.perf_counter_ns() - t0)
+    return {"texts_per_second": throughput, "single_query": summarize(latencies)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare encode throughput of the PyTorch and ONNX backends")
+    parser.add_argument("--model", default="nomic-ai/nomic-embed-text-v1.5")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="max allowed 1 - cosine vs the torch backend")
+    parser.add_argument("--output", default="encoder_benchmark.json")
+    args = parser.parse_args()
+
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",")]
+    check_texts = texts_for(64)
+    reference = None
+    results = {}
+
+    for backend in args.backends.split(","):
+        t0 = time.perf_counter()
+        model = load_encoder(args.model, backend, threads=args.threads, trust_remote_code=True)
+        load_seconds = time.perf_counter() - t0
+
+        result = {"load_seconds": round(load_seconds, 2)}
+        if backend == "torch":
+            reference = model
+        elif reference is not None:
+            deviation = max_cosine_deviation(reference, model, check_texts)
+            result["max_cosine_deviation"] = round(deviation, 5)
+            result["within_tolerance"] = deviation <= args.tolerance
+        result.update(benchmark_backend(model, batch_sizes, args.texts, args.warmup, args.runs))
+        results[backend] = result
+
+        line = f"{backend:>10}: load {load_seconds:6.2f} s"
+        for batch_size, rate in result["texts_per_second"].items():
+            line += f"  bs={batch_size}: {rate:8.1f} texts/s"
+        line += f"  p50 {result['single_query']['p50_ms']:.2f} ms"
+        if "max_cosine_deviation" in result:
+            line += f"  deviation {result['max_cosine_deviation']:.5f}"
+        print(line)
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "config": vars(args), "results": results}, f, indent=2)
+    print(f"wrote {args.output}")
@@ -0,0 +1,73 @@
+import argparse
+import json
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def timed_request(url, method="GET"):
+    """Sends one request and returns its latency in seconds."""
+    request = urllib.request.Request(url, method=method)
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - t0
+
+def run_level(base_url, endpoint, concurrency, n_requests, run_id):
+    """
+    Sends n_requests requests with concurrency requests in flight at a time.
+
+    Every request uses distinct text, so the query-embedding cache cannot
+    answer it and each one reaches the encoder.
+
+    Returns:
+        dict: Throughput and latency percentiles for this concurrency level.
+    """
+    def url_for(i):
+        text = f"load test {run_id} concurrency {concurrency} request {i}"
+        if endpoint == "add":
+            params = {"id": f"load_{run_id}_{concurrency}_{i}", "text": text}
+            return f"{base_url}/add/?{urllib.parse.urlencode(params)}", "POST"
+        return f"{base_url}/query/?{urllib.parse.urlencode({'query': text})}", "GET"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(lambda i: timed_request(*url_for(i)), range(n_requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "throughput_rps": round(n_requests / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Matryoshka service's encode micro-batching")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["query", "add"], default="query")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    args = parser.parse_args()
+
+    run_id = int(time.time())
+    # One warm-up request so model and index loading are not measured
+    timed_request(f"{args.url}/query/?query=warm+up")
+
+    results = []
+    for concurrency in [int(x) for x in args.concurrency.split(",")]:
+        result = run_level(args.url, args.endpoint, concurrency, args.requests, run_id)
+        results.append(result)
+        print(f"concurrency {result['concurrency']:>4}: {result['throughput_rps']:8.2f} req/s  "
+              f"p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms")
+
+    with urllib.request.urlopen(f"{args.url}/batcher_stats/") as response:
+        print("batcher:", json.load(response))
@@ -1,11 +1,22 @@
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Optional
+from collections import OrderedDict
+import asyncio
+import functools
+import os
+import threading
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import time
 import random
 import string
 import numpy as np
+from quantized_store import QuantizedStore
+from embedding_matrix import EmbeddingMatrix
+from benchmark_suite import summarize
+from encoder_backend import load_encoder
  
 app = FastAPI()
  
@@ -13,29 +24,356 @@ app = FastAPI()
 chroma_client = chromadb.PersistentClient(path="./chroma_db")
 collection = chroma_client.get_or_create_collection(name="matryoshka-docs")
  
-# Load embedding model
-model = SentenceTransformer("nomic-ai/nomic-embed-text-v1.5", trust_remote_code=True)
+# Low-dimension tiers of the same embeddings (first d dims, cosine space) for first-stage search
+TIER_DIMS = (64, 128, 256)
+tier_collections = {
+    d: chroma_client.get_or_create_collection(name=f"matryoshka-docs-{d}", metadata={"hnsw:space": "cosine"})
+    for d in TIER_DIMS
+}
+ 
+# int8 / binary copies of the embeddings for quantized first-stage search
+quantized_store = QuantizedStore.load("./chroma_db/quantized")
+QUANTIZED_MODES = ("int8", "binary")
+ 
+# Pre-normalized float32 embeddings, memory-mapped next to the Chroma files, for rescoring
+embedding_matrix = EmbeddingMatrix("./chroma_db/embedding_matrix")
+ 
+# Load embedding model (EMBEDDING_BACKEND=torch|onnx|onnx-int8, EMBEDDING_THREADS=n)
+model = load_encoder("nomic-ai/nomic-embed-text-v1.5", trust_remote_code=True)
+ 
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by normalized query text, bounded by
+    entry count and by a TTL (measured on the monotonic clock).
+ 
+    Handlers run in FastAPI's threadpool, so access is guarded by a lock.
+    The model is not called under the lock.
+    """
+ 
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (embedding, expires_at)
+        self._lock = threading.Lock()
+ 
+    @staticmethod
+    def normalize(text: str):
+        # nomic-embed uses an uncased tokenizer, so case and extra whitespace never change the embedding
+        return " ".join(text.split()).lower()
+ 
+    def get_or_encode(self, text: str):
+        """Returns the embedding of text, encoding it only on a miss (or when disabled)."""
+        if not self.enabled:
+            return model.encode(text)
+ 
+        embedding = self.lookup(text)
+        if embedding is None:
+            embedding = model.encode(text)
+            self.store(text, embedding)
+        return embedding
+ 
+    def lookup(self, text: str):
+        """Returns the cached embedding of text, or None on a miss (or when disabled)."""
+        if not self.enabled:
+            return None
+        key = self.normalize(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        return None
+ 
+    def store(self, text: str, embedding):
+        if not self.enabled:
+            return
+        # Cached arrays are shared between requests, so make them read-only
+        embedding.setflags(write=False)
+        with self._lock:
+            key = self.normalize(text)
+            self._entries[key] = (embedding, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+ 
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+ 
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+ 
+query_cache = QueryEmbeddingCache()
+ 
+class EncodeBatcher:
+    """
+    Dynamic micro-batcher for model.encode.
+ 
+    Concurrent requests queue their texts. A background task takes the
+    first waiting text, keeps collecting until max_batch_size texts or
+    max_wait_ms have passed, encodes them in one forward pass on a worker
+    thread (so the event loop keeps accepting requests) and resolves each
+    request's future with its own row. Texts that arrive during a forward
+    pass wait in the queue and form the next batch.
+    """
+ 
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.texts = 0
+        self._queue = None
+        self._worker = None
+ 
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+ 
+    async def stop(self):
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+ 
+    async def encode(self, text: str):
+        """Queues text for the next batch and waits for its embedding."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+ 
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+ 
+            texts = [text for text, _ in batch]
+            encode = functools.partial(model.encode, texts, batch_size=len(texts), convert_to_numpy=True)
+            try:
+                embeddings = await loop.run_in_executor(None, encode)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+ 
+            self.batches += 1
+            self.texts += len(texts)
+            for (_, future), embedding in zip(batch, embeddings):
+                # The caller may have disconnected and cancelled its future.
+                # Copy the row: a view would keep the whole batch matrix alive
+                # for as long as the query cache holds it
+                if not future.done():
+                    future.set_result(embedding.copy())
+ 
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
+ 
+encode_batcher = EncodeBatcher(
+    max_batch_size=int(os.environ.get("ENCODE_MAX_BATCH_SIZE", 32)),
+    max_wait_ms=float(os.environ.get("ENCODE_MAX_WAIT_MS", 5)),
+)
+ 
+@app.on_event("startup")
+async def start_encode_batcher():
+    encode_batcher.start()
+ 
+@app.on_event("shutdown")
+async def stop_encode_batcher():
+    await encode_batcher.stop()
+ 
+async def embed_query(query: str):
+    """Query embedding from the cache, or from the micro-batcher on a miss."""
+    embedding = query_cache.lookup(query)
+    if embedding is None:
+        embedding = await encode_batcher.encode(query)
+        query_cache.store(query, embedding)
+    return embedding
+ 
+# Request body for bulk ingest of real documents
+class BulkAddRequest(BaseModel):
+    documents: List[str]
+    ids: Optional[List[str]] = None
+ 
+def random_documents(n: int):
+    """Generates n random 30-character strings, for load testing without a dataset."""
+    return [''.join(random.choices(string.ascii_letters + string.digits, k=30)) for _ in range(n)]
+ 
+def add_to_index(docs, embs, ids, target=None, tiers=None):
+    """
+    Adds documents with their full embeddings to the full collection and
+    their truncated embeddings to every dimension tier.
+ 
+    Args:
+        docs (list of str): The documents.
+        embs (numpy.ndarray): Full-dimension embeddings, one row per document.
+        ids (list of str): The document ids.
+        target (Collection, optional): Full collection. Defaults to collection.
+        tiers (dict, optional): Dimension -> tier collection. Defaults to tier_collections.
+ 
+    Every store upserts, so re-adding a known id replaces its document and
+    vectors everywhere instead of Chroma keeping the old ones.
+    """
+    target = collection if target is None else target
+    tiers = tier_collections if tiers is None else tiers
+    target.upsert(documents=docs, embeddings=embs.tolist(), ids=ids)
+    for d, tier in tiers.items():
+        tier.upsert(embeddings=embs[:, :d].tolist(), ids=ids)
+    if target is collection:
+        # Only the service's own collection has quantized and memory-mapped
+        # copies; they are written after Chroma accepted the documents
+        quantized_store.add(ids, embs)
+        embedding_matrix.add(ids, embs)
+ 
+def ingest_in_batches(target, docs, ids, batch_size: int, tiers=None):
+    """
+    Encodes documents batch by batch and adds each batch to the collection
+    as soon as it is encoded, so memory stays bounded by one batch.
+ 
+    Returns:
+        float: Documents ingested per second.
+    """
+    start_time = time.perf_counter()
+    for start in range(0, len(docs), batch_size):
+        batch_docs = docs[start:start + batch_size]
+        # One forward pass per batch instead of one per document
+        batch_embs = model.encode(batch_docs, batch_size=batch_size, convert_to_numpy=True)
+        add_to_index(batch_docs, batch_embs, ids[start:start + batch_size], target, tiers)
+    elapsed = time.perf_counter() - start_time
+    return len(docs) / elapsed if elapsed > 0 else 0.0
  
 @app.post("/add/")
-def add_embedding(id: str, text: str):
-    embedding = model.encode(text)
-    collection.add(documents=[text], embeddings=[embedding.tolist()], ids=[id])
+async def add_embedding(id: str, text: str):
+    embedding = await encode_batcher.encode(text)
+    # Chroma calls block, so they run in the threadpool rather than on the event loop
+    await run_in_threadpool(add_to_index, [text], embedding[np.newaxis, :], [id])
     return {"status": "added", "id": id}
  
+def cosine_scores(arr, query):
+    """Cosine similarity of each row of arr with query."""
+    norms = np.linalg.norm(arr, axis=1) * np.linalg.norm(query)
+    return (arr @ query) / norms
+ 
+def adaptive_search(full_emb, dim: int, top_k: int, candidate_pool: int, timings: dict = None):
+    """
+    Adaptive retrieval: ANN search over the dim-dimension tier for a large
+    candidate pool, then rerank the candidates with their full vectors.
+    If timings is given, the nanoseconds spent in each stage are stored in
+    it under "ann" and "rescore".
+ 
+    Returns:
+        list of tuple: (id, document, full-dimension cosine score), best first.
+    """
+    t0 = time.perf_counter_ns()
+    first_stage = tier_collections[dim].query(
+        query_embeddings=[full_emb[:dim].tolist()],
+        n_results=candidate_pool,
+        include=[]
+    )
+    if timings is not None:
+        timings["ann"] = time.perf_counter_ns() - t0
+    return rescore(first_stage["ids"][0], full_emb, top_k, timings)
+ 
+def quantized_search(full_emb, mode: str, top_k: int, candidate_pool: int, timings: dict = None):
+    """
+    First-stage search over the int8 or binary store for a large candidate
+    pool, then float rescoring of the candidates.
+ 
+    Returns:
+        list of tuple: (id, document, full-dimension cosine score), best first.
+    """
+    t0 = time.perf_counter_ns()
+    if mode == "int8":
+        candidate_ids = quantized_store.search_int8(full_emb, candidate_pool)
+    else:
+        candidate_ids = quantized_store.search_binary(full_emb, candidate_pool)
+    if timings is not None:
+        timings["ann"] = time.perf_counter_ns() - t0
+    return rescore(candidate_ids, full_emb, top_k, timings)
+ 
+def rescore(candidate_ids, full_emb, top_k: int, timings: dict = None):
+    """Ranks candidate ids by full-dimension float cosine similarity to the query."""
+    t0 = time.perf_counter_ns()
+    if not candidate_ids:
+        chosen = []
+    elif all(doc_id in embedding_matrix for doc_id in candidate_ids):
+        # One gather + one matrix-vector product over pre-normalized rows; only the winners' text is fetched
+        scored = embedding_matrix.rescore(candidate_ids, full_emb, top_k)
+        winners = collection.get(ids=[doc_id for doc_id, _ in scored], include=["documents"])
+        doc_by_id = dict(zip(winners["ids"], winners["documents"]))
+        chosen = [(doc_id, doc_by_id.get(doc_id), score) for doc_id, score in scored]
+    else:
+        # Documents added before the embedding matrix existed: score Chroma's vectors
+        candidates = collection.get(ids=candidate_ids, include=["embeddings", "documents"])
+        sims = cosine_scores(np.array(candidates["embeddings"]), full_emb)
+        idxs = np.argsort(sims)[-top_k:][::-1]
+        chosen = [(candidates["ids"][i], candidates["documents"][i], float(sims[i])) for i in idxs]
+    if timings is not None:
+        timings["rescore"] = time.perf_counter_ns() - t0
+    return chosen
+ 
 @app.get("/query/")
-def query_embedding(query: str, top_k: int = 3, truncate_to: int = None, candidate_pool: int = 100):
+async def query_embedding(query: str, top_k: int = 3, truncate_to: int = None, candidate_pool: int = 100, quantized: Optional[str] = None):
     start_time = time.time()
-    # 1) Always compute full embedding for initial query
-    full_emb = model.encode(query)
-    # 2) Initial search against full-vector index, request embeddings & documents
+    # 1) Always compute full embedding for initial query (cached, micro-batched with concurrent requests)
+    full_emb = await embed_query(query)
+    return await run_in_threadpool(search_embedding, full_emb, start_time, top_k, truncate_to, candidate_pool, quantized)
+ 
+def search_embedding(full_emb, start_time, top_k: int, truncate_to: int, candidate_pool: int, quantized: Optional[str] = None):
+ 
+    # Quantized store: int8 dot-product or binary Hamming first stage, float rescoring
+    if quantized:
+        if quantized not in QUANTIZED_MODES:
+            return {"error": f"quantized must be one of {list(QUANTIZED_MODES)}"}
+        chosen = quantized_search(full_emb, quantized, top_k, candidate_pool)
+        elapsed = time.time() - start_time
+        return {"results": chosen, "query_time_seconds": round(elapsed,4)}
+ 
+    # Truncation to a tier dimension: search the small index, rerank with full vectors
+    if truncate_to in tier_collections:
+        chosen = adaptive_search(full_emb, truncate_to, top_k, candidate_pool)
+        elapsed = time.time() - start_time
+        return {"results": chosen, "query_time_seconds": round(elapsed,4)}
+ 
+    # 2) Initial search against full-vector index; vectors come from the embedding matrix when it has them
+    include = ["documents"] if truncate_to and embedding_matrix.size >= collection.count() else ["embeddings", "documents"]
     initial = collection.query(
         query_embeddings=[full_emb.tolist()],
         n_results=candidate_pool,
-        include=["embeddings", "documents"]
+        include=include
     )
     ids = initial["ids"][0]
     docs = initial.get("documents", [[]])[0]
-    embs = initial.get("embeddings", [[]])[0]  # list of full-length lists
  
     # 3) If no truncation requested, return top_k from initial
     if not truncate_to:
@@ -48,13 +386,17 @@ def query_embedding(query: str, top_k: int = 3, truncate_to: int = None, candida
     if dim > len(full_emb):
         return {"error": f"truncate_to ({dim}) exceeds embedding size ({len(full_emb)})"}
  
-    # 5) Slice all candidate embeddings
+    # 5) Slice all candidate embeddings (a row gather from the memory-mapped matrix, no list conversion)
     slice_query = full_emb[:dim]
-    arr = np.array(embs)[:, :dim]
+    if "embeddings" in include:
+        arr = np.array(initial["embeddings"][0])[:, :dim]
+    else:
+        known, vectors = embedding_matrix.gather(ids)
+        doc_by_id = dict(zip(ids, docs))
+        ids, docs, arr = known, [doc_by_id[doc_id] for doc_id in known], vectors[:, :dim]
  
     # 6) Compute cosine scores in subspace
-    norms = np.linalg.norm(arr, axis=1) * np.linalg.norm(slice_query)
-    sims = (arr @ slice_query) / norms
+    sims = cosine_scores(arr, slice_query)
  
     # 7) Select top_k by re-ranked similarity
     idxs = np.argsort(sims)[-top_k:][::-1]
@@ -65,60 +407,191 @@ def query_embedding(query: str, top_k: int = 3, truncate_to: int = None, candida
  
 @app.get("/persist/")
 def persist():
-    chroma_client.persist()
+    # Our own stores first, so they are saved whatever Chroma does
+    quantized_store.save()
+    embedding_matrix.flush()
+    # PersistentClient (chromadb >= 0.4) writes through and has no persist()
+    if hasattr(chroma_client, "persist"):
+        chroma_client.persist()
     return {"status": "persisted"}
  
+@app.on_event("shutdown")
+def save_stores():
+    # Documents added since the last /persist/ would otherwise be missing from quantized search after a restart
+    quantized_store.save()
+    embedding_matrix.flush()
+ 
+@app.get("/batcher_stats/")
+def batcher_stats():
+    return encode_batcher.stats()
+ 
+@app.get("/cache_stats/")
+def cache_stats():
+    return query_cache.stats()
+ 
+@app.post("/cache_config/")
+def cache_config(enabled: Optional[bool] = None, clear: bool = False, reset_counters: bool = False):
+    # Toggle the query-embedding cache (e.g. off for cold benchmarks), clear it, or zero its counters
+    if enabled is not None:
+        query_cache.enabled = enabled
+    if clear:
+        query_cache.clear()
+    if reset_counters:
+        query_cache.hits = query_cache.misses = 0
+    return query_cache.stats()
+ 
+@app.post("/build_quantized/")
+def build_quantized(batch_size: int = 1000):
+    # (Re)build the int8 / binary store from the full collection, calibrating int8 scales on all of it
+    ids, embs = [], []
+    for offset in range(0, collection.count(), batch_size):
+        page = collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        ids.extend(page["ids"])
+        embs.extend(page["embeddings"])
+    if ids:
+        quantized_store.build(ids, np.array(embs, dtype=np.float32))
+        quantized_store.save()
+    return {"status": "quantized store built", **quantized_store.stats()}
+ 
+@app.post("/build_embedding_matrix/")
+def build_embedding_matrix(batch_size: int = 1000):
+    # Backfill the memory-mapped rescoring matrix from the full collection
+    for offset in range(0, collection.count(), batch_size):
+        page = collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        embedding_matrix.add(page["ids"], np.array(page["embeddings"], dtype=np.float32))
+    embedding_matrix.flush()
+    return {"status": "embedding matrix built", "count": embedding_matrix.size}
+ 
+@app.get("/quantized_stats/")
+def quantized_stats():
+    return quantized_store.stats()
+ 
+@app.post("/build_tiers/")
+def build_tiers(batch_size: int = 1000):
+    # Backfill the dimension tiers from embeddings already in the full collection
+    added = 0
+    for offset in range(0, collection.count(), batch_size):
+        page = collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        embs = np.array(page["embeddings"])
+        for d, tier in tier_collections.items():
+            tier.upsert(embeddings=embs[:, :d].tolist(), ids=page["ids"])
+        added += len(page["ids"])
+    return {"status": "tiers built", "count": added, "dimensions": list(TIER_DIMS)}
+ 
 @app.post("/add_bulk/")
-def add_bulk(n: int = 1000):
-    docs = []
-    ids = []
-    embeddings = []
+def add_bulk(request: Optional[BulkAddRequest] = None, n: int = 1000, batch_size: int = 64):
+    # Real documents from the request body, or n random strings when no body is sent
+    if request is not None:
+        docs = request.documents
+        ids = request.ids or [f"doc_{i}" for i in range(len(docs))]
+        if len(ids) != len(docs):
+            return {"error": f"got {len(ids)} ids for {len(docs)} documents"}
+    else:
+        docs = random_documents(n)
+        ids = [f"doc_{i}" for i in range(n)]
+ 
+    docs_per_second = ingest_in_batches(collection, docs, ids, batch_size)
+    return {"status": "bulk added", "count": len(docs), "batch_size": batch_size,
+            "docs_per_second": round(docs_per_second, 2)}
+ 
+@app.post("/benchmark_add_bulk/")
+def benchmark_add_bulk(n: int = 1000, batch_sizes: str = "1,8,32,128"):
+    # Ingest the same documents at each batch size into a scratch collection
+    docs = random_documents(n)
+    ids = [f"bench_{i}" for i in range(n)]
+    results = []
  
-    for i in range(n):
-        text = ''.join(random.choices(string.ascii_letters + string.digits, k=30))
-        emb = model.encode(text)
-        docs.append(text)
-        ids.append(f"doc_{i}")
-        embeddings.append(emb.tolist())
+    for batch_size in [int(x) for x in batch_sizes.split(",")]:
+        # Scratch tiers too, so the rate includes writing every dimension tier
+        scratch = chroma_client.get_or_create_collection(name="matryoshka-bulk-benchmark")
+        scratch_tiers = {
+            d: chroma_client.get_or_create_collection(name=f"matryoshka-bulk-benchmark-{d}", metadata={"hnsw:space": "cosine"})
+            for d in TIER_DIMS
+        }
+        try:
+            docs_per_second = ingest_in_batches(scratch, docs, ids, batch_size, scratch_tiers)
+        finally:
+            chroma_client.delete_collection(name="matryoshka-bulk-benchmark")
+            for d in TIER_DIMS:
+                chroma_client.delete_collection(name=f"matryoshka-bulk-benchmark-{d}")
+        results.append({"batch_size": batch_size, "docs_per_second": round(docs_per_second, 2)})
  
-    collection.add(documents=docs, embeddings=embeddings, ids=ids)
-    return {"status": "bulk added", "count": n}
+    return {"count": n, "benchmark_results": results}
  
 @app.get("/benchmark_query/")
-def benchmark_query(query: str = "semantic search", runs: int = 5, dims_list: str = "full,256,128,64", top_k: int = 3, candidate_pool: int = 100):
-    dims = [None if x.strip() == "full" else int(x) for x in dims_list.split(",")]
+def benchmark_query(query: str = "semantic search", runs: int = 20, warmup: int = 3, dims_list: str = "full,256,128,64", top_k: int = 3, candidate_pool: int = 100):
+    # Entries are "full", a tier dimension, or a quantized mode ("int8" / "binary")
+    dims = [None if x.strip() == "full" else x.strip() if x.strip() in QUANTIZED_MODES else int(x) for x in dims_list.split(",")]
+    unknown = [d for d in dims if d is not None and d not in tier_collections and d not in QUANTIZED_MODES]
+    if unknown:
+        return {"error": f"no index tier for dimensions {unknown}; available tiers: {list(TIER_DIMS)}"}
     results = []
  
-    for d in dims:
-        times = []
+    # Query encoding, timed on its own: cold is a model forward pass every run, warm is a cache hit
+    for _ in range(warmup):
+        model.encode(query)
+    cold_times = []
+    for _ in range(runs):
+        t0 = time.perf_counter_ns()
+        model.encode(query)
+        cold_times.append(time.perf_counter_ns() - t0)
+    encode_stats = {"cold": summarize(cold_times)}
+    if query_cache.enabled:
+        query_cache.get_or_encode(query)
+        warm_times = []
         for _ in range(runs):
-            t0 = time.time()
-            # full embed + initial search with embeddings
-            full_emb = model.encode(query)
+            t0 = time.perf_counter_ns()
+            query_cache.get_or_encode(query)
+            warm_times.append(time.perf_counter_ns() - t0)
+        encode_stats["warm"] = summarize(warm_times)
+ 
+    # Search runs reuse one embedding; exact top_k by full-dimension cosine over every document is the recall reference
+    full_emb = query_cache.get_or_encode(query)
+    if embedding_matrix.size >= collection.count():
+        exact_ids = {doc_id for doc_id, _ in embedding_matrix.rescore(embedding_matrix.ids, full_emb, top_k)}
+    else:
+        everything = collection.get(include=["embeddings"])
+        all_sims = cosine_scores(np.array(everything["embeddings"]), full_emb)
+        exact_ids = {everything["ids"][i] for i in np.argsort(all_sims)[-top_k:]}
+ 
+    def search(d, timings):
+        if not d:
+            # full-dimension ANN search
+            t0 = time.perf_counter_ns()
             init = collection.query(
                 query_embeddings=[full_emb.tolist()],
-                n_results=candidate_pool,
-                include=["embeddings"]
+                n_results=top_k,
+                include=[]
             )
-            embs = init.get("embeddings", [[]])[0]
- 
-            if not d:
-                # no slicing; ignore sims
-                pass
-            else:
-                # slice and re-rank
-                slice_q = full_emb[:d]
-                arr = np.array(embs)[:, :d]
-                norms = np.linalg.norm(arr, axis=1) * np.linalg.norm(slice_q)
-                sims = (arr @ slice_q) / norms
-            elapsed = time.time() - t0
-            times.append(elapsed)
- 
-        avg = sum(times) / runs
+            timings["ann"] = time.perf_counter_ns() - t0
+            return init["ids"][0]
+        if d in QUANTIZED_MODES:
+            # quantized first stage, then float rescoring
+            return [doc_id for doc_id, _, _ in quantized_search(full_emb, d, top_k, candidate_pool, timings)]
+        # low-dimension ANN search, then full-vector rerank
+        return [doc_id for doc_id, _, _ in adaptive_search(full_emb, d, top_k, candidate_pool, timings)]
+ 
+    for d in dims:
+        # Warm-up runs load index pages and caches and are not measured
+        for _ in range(warmup):
+            search(d, {})
+ 
+        stage_times = {"total": [], "ann": [], "rescore": []}
+        for _ in range(runs):
+            timings = {"ann": 0, "rescore": 0}
+            t0 = time.perf_counter_ns()
+            found_ids = search(d, timings)
+            stage_times["total"].append(time.perf_counter_ns() - t0)
+            stage_times["ann"].append(timings["ann"])
+            stage_times["rescore"].append(timings["rescore"])
+ 
+        recall = len(exact_ids.intersection(found_ids)) / len(exact_ids) if exact_ids else 0.0
         results.append({
             "dimensions": "full" if d is None else d,
-            "avg_query_time_seconds": round(avg,5),
-            "individual_run_times": [round(x,5) for x in times]
+            "total": summarize(stage_times["total"]),
+            "ann_search": summarize(stage_times["ann"]),
+            "rescore": summarize(stage_times["rescore"]),
+            f"recall_at_{top_k}": round(recall,4)
         })
  
-    return {"benchmark_results": results}
\ No newline at end of file
+    return {"query_encoding": encode_stats, "benchmark_results": results}
\ No newline at end of file
@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Popcount of every byte value, for Hamming distance on numpy versions without bitwise_count
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount_rows(packed):
+    """Number of set bits in each row of a packed uint8 bit matrix."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(packed).sum(axis=1, dtype=np.int32)
+    return POPCOUNT_TABLE[packed].sum(axis=1, dtype=np.int32)
+
+def top_rows(scores, k):
+    """Row indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    rows = np.argpartition(-scores, k - 1)[:k]
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+class QuantizedStore:
+    """
+    Compact copies of the embeddings for fast first-stage search.
+
+    Embeddings are L2-normalized, then kept two ways:
+      int8    per-dimension symmetric scalar quantization (4x smaller than float32)
+      binary  one sign bit per dimension, packed 8 per byte (32x smaller)
+
+    int8 search scores every row by dot product with the float query scaled
+    into code space; binary search ranks rows by Hamming distance to the
+    query's sign bits. Both are approximate, so callers rescore the top
+    candidates with the float vectors.
+
+    build() calibrates the int8 scales on the whole collection. A store
+    filled by add() starts with the fixed scale 1/127, which cannot clip
+    unit vectors, keeps the float rows until it holds calibration_rows of
+    them, then calibrates on those and requantizes (also across a save and
+    load). Later values outside the calibrated range are clipped. Arrays are saved as .npy files and
+    reopened memory-mapped.
+    """
+
+    def __init__(self, path: str, calibration_rows: int = 1024):
+        """
+        Args:
+            path (str): Directory holding the store's files.
+            calibration_rows (int, optional): Rows added before int8 scales
+                are calibrated automatically.
+        """
+        self.path = path
+        self.calibration_rows = calibration_rows
+        self.ids = []
+        self.id_to_row = {}
+        self.scales = None
+        self.size = 0
+        self.int8_codes = None
+        self.binary_codes = None
+        # Row -> float row, kept only while the scales are still the fixed provisional ones
+        self._uncalibrated = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embs):
+        embs = np.asarray(embs, dtype=np.float32)
+        norms = np.linalg.norm(embs, axis=1, keepdims=True)
+        return embs / np.maximum(norms, 1e-12)
+
+    def _quantize(self, unit_embs):
+        codes = np.clip(np.rint(unit_embs / self.scales), -127, 127).astype(np.int8)
+        return codes, np.packbits(unit_embs > 0, axis=1)
+
+    @staticmethod
+    def _calibrated_scales(unit_embs):
+        return np.maximum(np.abs(unit_embs).max(axis=0), 1e-6) / 127
+
+    def build(self, ids, embs):
+        """Replaces the store's contents, calibrating int8 scales on embs."""
+        unit_embs = self._normalize(embs)
+        with self._lock:
+            self.scales = self._calibrated_scales(unit_embs)
+            self.int8_codes, self.binary_codes = self._quantize(unit_embs)
+            self.ids = list(ids)
+            self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            self.size = len(self.ids)
+            self._uncalibrated = None
+
+    def add(self, ids, embs):
+        """Appends (or overwrites, for known ids) embeddings."""
+        unit_embs = self._normalize(embs)
+        with self._lock:
+            if self.scales is None:
+                # Calibrating on a handful of documents would clip most later ones
+                dim = unit_embs.shape[1]
+                self.scales = np.full(dim, 1 / 127, dtype=np.float32)
+                self.int8_codes = np.zeros((0, dim), dtype=np.int8)
+                self.binary_codes = np.zeros((0, (dim + 7) // 8), dtype=np.uint8)
+                self._uncalibrated = {}
+
+            int8_codes, binary_codes = self._quantize(unit_embs)
+            for doc_id, unit_emb, code, bits in zip(ids, unit_embs, int8_codes, binary_codes):
+                self._ensure_capacity(self.size + 1)
+                row = self.id_to_row.get(doc_id)
+                if row is None:
+                    row = self.size
+                    self.ids.append(doc_id)
+                    self.id_to_row[doc_id] = row
+                    self.size += 1
+                self.int8_codes[row] = code
+                self.binary_codes[row] = bits
+                if self._uncalibrated is not None:
+                    self._uncalibrated[row] = unit_emb
+
+            if self._uncalibrated is not None and self.size >= self.calibration_rows:
+                unit_embs = np.stack([self._uncalibrated[row] for row in range(self.size)])
+                self.scales = self._calibrated_scales(unit_embs)
+                self.int8_codes[:self.size] = self._quantize(unit_embs)[0]
+                self._uncalibrated = None
+
+    def _ensure_capacity(self, n_rows):
+        # Grow by doubling; this also copies memory-mapped (read-only) arrays into RAM
+        capacity = len(self.int8_codes)
+        if n_rows <= capacity and self.int8_codes.flags.writeable:
+            return
+        capacity = max(n_rows, 2 * capacity, 1024)
+        for name in ("int8_codes", "binary_codes"):
+            old = getattr(self, name)
+            new = np.zeros((capacity, old.shape[1]), dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _snapshot(self):
+        with self._lock:
+            return self.size, self.int8_codes, self.binary_codes, self.scales
+
+    def search_int8(self, query, k: int, chunk_rows: int = 4096):
+        """
+        Top k rows by int8 dot product with the normalized query.
+
+        NumPy has no int8 matrix product, so codes are upcast to float32 in
+        cache-sized chunks and fed to the BLAS matrix-vector product.
+
+        Returns:
+            list of str: Candidate ids, best first.
+        """
+        size, codes, _, scales = self._snapshot()
+        if size == 0:
+            return []
+        query = self._normalize(query[np.newaxis, :])[0] * scales
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, chunk_rows):
+            end = min(start + chunk_rows, size)
+            scores[start:end] = codes[start:end].astype(np.float32) @ query
+        return [self.ids[row] for row in top_rows(scores, k)]
+
+    def search_binary(self, query, k: int):
+        """
+        Top k rows by Hamming distance between sign bits.
+
+        Returns:
+            list of str: Candidate ids, best first.
+        """
+        size, _, codes, _ = self._snapshot()
+        if size == 0:
+            return []
+        query_bits = np.packbits(query > 0)
+        distances = popcount_rows(np.bitwise_xor(codes[:size], query_bits))
+        return [self.ids[row] for row in top_rows(-distances, k)]
+
+    def stats(self):
+        dim = len(self.scales) if self.scales is not None else 0
+        return {
+            "count": self.size,
+            "dimensions": dim,
+            "float32_bytes": self.size * dim * 4,
+            "int8_bytes": self.size * dim,
+            "binary_bytes": self.size * ((dim + 7) // 8),
+        }
+
+    def _replace(self, name, write):
+        # Write beside the target and rename over it: the old file may still
+        # be memory-mapped by this store, so it must never be truncated in place
+        target = os.path.join(self.path, name)
+        tmp = target + ".tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, target)
+
+    def save(self):
+        """Writes the store to its directory."""
+        os.makedirs(self.path, exist_ok=True)
+        size, int8_codes, binary_codes, scales = self._snapshot()
+        if scales is None:
+            return
+        ids = self.ids[:size]
+        calibrated = self._uncalibrated is None
+        self._replace("int8.npy", lambda f: np.save(f, int8_codes[:size]))
+        self._replace("binary.npy", lambda f: np.save(f, binary_codes[:size]))
+        self._replace("scales.npy", lambda f: np.save(f, scales))
+        self._replace("calibration.json", lambda f: f.write(json.dumps({"calibrated": calibrated}).encode()))
+        # ids.json last: load() treats its presence as a complete store
+        self._replace("ids.json", lambda f: f.write(json.dumps(ids).encode()))
+
+    @classmethod
+    def load(cls, path: str, calibration_rows: int = 1024):
+        """Opens a saved store with its code arrays memory-mapped, or an empty store."""
+        store = cls(path, calibration_rows)
+        if not os.path.exists(os.path.join(path, "ids.json")):
+            return store
+        with open(os.path.join(path, "ids.json")) as f:
+            store.ids = json.load(f)
+        store.id_to_row = {doc_id: row for row, doc_id in enumerate(store.ids)}
+        store.size = len(store.ids)
+        store.scales = np.load(os.path.join(path, "scales.npy"))
+        store.int8_codes = np.load(os.path.join(path, "int8.npy"), mmap_mode="r")
+        store.binary_codes = np.load(os.path.join(path, "binary.npy"), mmap_mode="r")
+
+        # A store saved before it reached calibration_rows still has the
+        # provisional scales; dequantized codes are precise enough to
+        # calibrate on once enough rows are added
+        calibration_path = os.path.join(path, "calibration.json")
+        if os.path.exists(calibration_path):
+            with open(calibration_path) as f:
+                if not json.load(f)["calibrated"]:
+                    unit_embs = store._normalize(store.int8_codes[:store.size] * store.scales)
+                    store._uncalibrated = dict(enumerate(unit_embs))
+        return store
@@ -1,6 +1,6 @@
 import os
 from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
+from MatryoshkaEmbeddings.encoder_backend import load_encoder
 import numpy as np
 
 # It's recommended to set API keys as environment variables
@@ -22,7 +22,8 @@ except Exception as e:
 
 # Load the pre-trained Hugging Face model
 # This model creates 384-dimensional embeddings.
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Set EMBEDDING_BACKEND=onnx-int8 to run it with quantized ONNX Runtime instead of PyTorch.
+model = load_encoder('all-MiniLM-L6-v2')
 embedding_dimension = 384
 
 # Define the name of the index
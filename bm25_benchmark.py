@@ -0,0 +1,372 @@
+import itertools
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from BM25 import ENGLISH_STOP_WORDS, Analyzer, BM25Okapi, BM25Sparse, ShardedBM25, suffix_stemmer
+
+def generate_corpus(n_docs, vocab_size=50000, doc_len=60, seed=42):
+    """
+    Generates a synthetic corpus with a Zipf-like term distribution, so a few
+    terms are very common and most terms are rare (like real text).
+
+    Args:
+        n_docs (int): Number of documents to generate.
+        vocab_size (int, optional): Number of distinct terms. Defaults to 50000.
+        doc_len (int, optional): Average document length in tokens. Defaults to 60.
+        seed (int, optional): Random seed. Defaults to 42.
+
+    Returns:
+        list of str: The generated documents.
+    """
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    # Cumulative weights are computed once rather than on every choices() call
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(vocab_size)))
+    corpus = []
+    for _ in range(n_docs):
+        length = max(1, int(rng.gauss(doc_len, doc_len / 4)))
+        corpus.append(" ".join(rng.choices(vocab, cum_weights=cum_weights, k=length)))
+    return corpus
+
+def generate_queries(n_queries, vocab_size=50000, terms_per_query=3, seed=7):
+    """Generates queries made of mid-frequency terms from the synthetic vocabulary."""
+    rng = random.Random(seed)
+    return [
+        " ".join(f"term{rng.randint(10, vocab_size // 10)}" for _ in range(terms_per_query))
+        for _ in range(n_queries)
+    ]
+
+def dense_get_scores(bm25, query):
+    """
+    Reference scorer that loops over every document and every query token,
+    as BM25Okapi.get_scores did before the inverted index was added.
+    """
+    query_tokens = bm25._tokenize(query)
+    scores = [0.0] * bm25.doc_count
+    # doc_term_freqs is keyed by term id; terms missing from the vocabulary match nothing
+    query_terms = [(bm25.vocab[term], bm25._get_idf(term)) for term in query_tokens if term in bm25.vocab]
+
+    for i in range(bm25.doc_count):
+        score = 0
+        doc_len = bm25.doc_lengths[i]
+        term_freqs = bm25.doc_term_freqs[i]
+
+        for term_id, idf in query_terms:
+            if term_id not in term_freqs:
+                continue
+
+            freq = term_freqs[term_id]
+            numerator = freq * (bm25.k1 + 1)
+            denominator = freq + bm25.k1 * (1 - bm25.b + bm25.b * (doc_len / bm25.avg_doc_length))
+            score += idf * (numerator / denominator)
+
+        scores[i] = score
+
+    return scores
+
+def time_queries(fn, queries):
+    """Runs fn over all queries and returns the average latency in milliseconds."""
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+def benchmark_inverted_index(sizes, n_queries=50):
+    """Compares the dense per-document loop against the postings-list scorer."""
+    print("--- Dense loop vs inverted index (get_scores) ---")
+    queries = generate_queries(n_queries)
+    for size in sizes:
+        bm25 = BM25Okapi(generate_corpus(size))
+
+        # Both scorers must agree before their timings mean anything
+        for query in queries[:5]:
+            for a, b in zip(dense_get_scores(bm25, query), bm25.get_scores(query)):
+                assert abs(a - b) < 1e-9, "Inverted index scores differ from dense loop"
+
+        dense_ms = time_queries(lambda q: dense_get_scores(bm25, q), queries)
+        inverted_ms = time_queries(bm25.get_scores, queries)
+        print(f"Docs: {size:>8}\tDense: {dense_ms:8.2f} ms\tInverted: {inverted_ms:8.2f} ms"
+              f"\tSpeedup: {dense_ms / inverted_ms:6.1f}x")
+
+def measure_build(cls, corpus):
+    """Builds an index and returns it with its build time (s) and retained memory (MB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = cls(corpus)
+    build_s = time.perf_counter() - start
+    retained_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+    return index, build_s, retained_mb
+
+def benchmark_sparse_backend(sizes, n_queries=50):
+    """Compares memory and query latency of the dict-based and CSR backends."""
+    print("--- BM25Okapi vs BM25Sparse (CSR) ---")
+    queries = generate_queries(n_queries)
+    for size in sizes:
+        corpus = generate_corpus(size)
+        okapi, okapi_build, okapi_mb = measure_build(BM25Okapi, corpus)
+        csr, csr_build, csr_mb = measure_build(BM25Sparse, corpus)
+
+        for query in queries[:5]:
+            for a, b in zip(okapi.get_scores(query), csr.get_scores(query)):
+                assert abs(a - b) < 1e-4 * max(1.0, a), "Sparse backend scores differ from BM25Okapi"
+
+        okapi_ms = time_queries(okapi.get_scores, queries)
+        csr_ms = time_queries(csr.get_scores, queries)
+        print(f"Docs: {size:>8}\tOkapi: {okapi_mb:8.1f} MB {okapi_build:6.2f} s build {okapi_ms:7.2f} ms/query"
+              f"\tSparse: {csr_mb:8.1f} MB {csr_build:6.2f} s build {csr_ms:7.2f} ms/query")
+
+def exhaustive_top_n(bm25, query, n):
+    """Reference top n: score every document and fully sort, as get_top_n used to."""
+    doc_scores = [(doc, score) for doc, score in zip(bm25.corpus, bm25.get_scores(query)) if doc is not None]
+    doc_scores.sort(key=lambda x: x[1], reverse=True)
+    return doc_scores[:n]
+
+def benchmark_top_n(sizes, n_queries=50, n=10):
+    """Checks MaxScore top n against the exhaustive path and compares latency."""
+    print(f"--- Exhaustive sort vs MaxScore pruning (top {n}) ---")
+    # Mix of rare-term and common-term queries; common terms are where pruning pays off
+    queries = generate_queries(n_queries) + [f"term0 term1 term{i}" for i in range(100, 100 + n_queries)]
+    for size in sizes:
+        bm25 = BM25Okapi(generate_corpus(size))
+
+        for query in queries:
+            for k in (1, n, 100):
+                assert bm25.get_top_n(query, k) == exhaustive_top_n(bm25, query, k), \
+                    f"MaxScore top {k} differs from exhaustive results for {query!r}"
+
+        exhaustive_ms = time_queries(lambda q: exhaustive_top_n(bm25, q, n), queries)
+        pruned_ms = time_queries(lambda q: bm25.get_top_n(q, n), queries)
+        print(f"Docs: {size:>8}\tExhaustive: {exhaustive_ms:8.2f} ms\tMaxScore: {pruned_ms:8.2f} ms"
+              f"\tSpeedup: {exhaustive_ms / pruned_ms:6.1f}x")
+
+def benchmark_incremental_updates(sizes, batch_size=1000):
+    """Measures add/remove throughput as the index grows, versus a full rebuild."""
+    print(f"--- Incremental add_documents / remove_documents (batches of {batch_size}) ---")
+    rng = random.Random(0)
+    bm25 = BM25Okapi([])
+    for size in sorted(sizes):
+        # Grow the index to the target size
+        missing = size - bm25.doc_count
+        if missing > 0:
+            bm25.add_documents(generate_corpus(missing, seed=size))
+
+        batch = generate_corpus(batch_size, seed=size + 1)
+        start = time.perf_counter()
+        bm25.add_documents(batch)
+        add_rate = batch_size / (time.perf_counter() - start)
+
+        live_ids = [doc_id for doc_id, doc in enumerate(bm25.corpus) if doc is not None]
+        start = time.perf_counter()
+        bm25.remove_documents(rng.sample(live_ids, batch_size))
+        remove_rate = batch_size / (time.perf_counter() - start)
+
+        live_docs = [doc for doc in bm25.corpus if doc is not None]
+        start = time.perf_counter()
+        BM25Okapi(live_docs)
+        rebuild_s = time.perf_counter() - start
+        print(f"Docs: {size:>8}\tAdd: {add_rate:10.0f} docs/s\tRemove: {remove_rate:10.0f} docs/s"
+              f"\tFull rebuild: {rebuild_s:6.2f} s")
+
+def benchmark_persistence(sizes, n_queries=50):
+    """Compares building an index from text against loading a saved one."""
+    print("--- Build from corpus vs save / load (mmap) ---")
+    queries = generate_queries(n_queries)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            corpus = generate_corpus(size)
+            start = time.perf_counter()
+            bm25 = BM25Okapi(corpus)
+            build_s = time.perf_counter() - start
+
+            path = os.path.join(tmp_dir, f"bm25_{size}.idx")
+            bm25.save(path)
+
+            start = time.perf_counter()
+            mapped = BM25Okapi.load(path, mmap=True)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            for query in queries[:5]:
+                assert mapped.get_top_n(query, 10) == bm25.get_top_n(query, 10), "Loaded index differs"
+
+            # The first pass decodes postings from the file, the second hits the LRU cache
+            mapped = BM25Okapi.load(path, mmap=True)
+            cold_ms = time_queries(lambda q: mapped.get_top_n(q, 10), queries)
+            warm_ms = time_queries(lambda q: mapped.get_top_n(q, 10), queries)
+            memory_ms = time_queries(lambda q: bm25.get_top_n(q, 10), queries)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            print(f"Docs: {size:>8}\tBuild: {build_s:6.2f} s\tLoad: {load_ms:6.2f} ms\tFile: {size_mb:6.1f} MB"
+                  f"\tQuery in-memory: {memory_ms:6.2f} ms, mmap cold: {cold_ms:6.2f} ms, warm: {warm_ms:6.2f} ms")
+
+def benchmark_parallel_build(sizes, chunk_size=5000):
+    """Measures index build time with an increasing number of worker processes."""
+    print(f"--- Parallel index build (chunks of {chunk_size}) ---")
+    job_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    queries = generate_queries(5)
+    for size in sizes:
+        corpus = generate_corpus(size)
+        serial = None
+        timings = []
+        for n_jobs in job_counts:
+            start = time.perf_counter()
+            bm25 = BM25Okapi(corpus, n_jobs=n_jobs, chunk_size=chunk_size)
+            timings.append((n_jobs, time.perf_counter() - start))
+            if serial is None:
+                serial = bm25
+            else:
+                for query in queries:
+                    assert bm25.get_scores(query) == serial.get_scores(query), "Parallel build differs"
+        serial_s = timings[0][1]
+        print(f"Docs: {size:>8}\t" + "\t".join(
+            f"{n_jobs} jobs: {build_s:6.2f} s ({serial_s / build_s:4.1f}x)" for n_jobs, build_s in timings
+        ))
+
+def benchmark_batch_queries(sizes, n_queries=2000, n=10, repeats=3):
+    """
+    Compares queries/second of a get_top_n loop against get_top_n_batch.
+
+    Each rate is the best of `repeats` runs. For the process pool, the
+    first call (which starts the workers and copies the index to them) is
+    reported separately from later calls that reuse the pool.
+    """
+    print(f"--- Per-query loop vs get_top_n_batch ({n_queries} queries, top {n}, best of {repeats}) ---")
+    # Evaluation-style queries: like natural-language questions, each mixes a
+    # couple of very common terms (shared across the batch) with rarer ones
+    rng = random.Random(11)
+    queries = [
+        " ".join([f"term{rng.randint(0, 20)}" for _ in range(2)] + [f"term{rng.randint(21, 5000)}" for _ in range(2)])
+        for _ in range(n_queries)
+    ]
+    job_counts = sorted({2, os.cpu_count() or 1} - {1})
+
+    def best_qps(fn):
+        best = math.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return n_queries / best
+
+    for size in sizes:
+        bm25 = BM25Okapi(generate_corpus(size))
+        expected = [bm25.get_top_n(query, n) for query in queries]
+        assert bm25.get_top_n_batch(queries, n) == expected, "Batch results differ from get_top_n"
+
+        loop_qps = best_qps(lambda: [bm25.get_top_n(query, n) for query in queries])
+        batch_qps = best_qps(lambda: bm25.get_top_n_batch(queries, n))
+        line = f"Docs: {size:>8}\tLoop: {loop_qps:8.0f} q/s\tBatch: {batch_qps:8.0f} q/s"
+        for n_jobs in job_counts:
+            start = time.perf_counter()
+            assert bm25.get_top_n_batch(queries, n, n_jobs=n_jobs) == expected, "Parallel batch differs"
+            first_qps = n_queries / (time.perf_counter() - start)
+            warm_qps = best_qps(lambda: bm25.get_top_n_batch(queries, n, n_jobs=n_jobs))
+            line += f"\t{n_jobs} jobs: first call {first_qps:8.0f} q/s, reused pool {warm_qps:8.0f} q/s"
+        bm25.close_query_pool()
+        print(line)
+
+def benchmark_analyzers(sizes, n_queries=5000):
+    """Measures indexing cost per analyzer chain and the effect of the query cache."""
+    print("--- Analyzer chains and query cache ---")
+    chains = {
+        "default": Analyzer(),
+        "stopwords": Analyzer(stopwords=ENGLISH_STOP_WORDS),
+        "stopwords+stem": Analyzer(stopwords=ENGLISH_STOP_WORDS, stemmer=suffix_stemmer),
+    }
+    # Search-log style traffic: a small set of popular queries repeated many times
+    rng = random.Random(3)
+    popular = generate_queries(200)
+    queries = [rng.choice(popular) for _ in range(n_queries)]
+    for size in sizes:
+        corpus = generate_corpus(size)
+        line = f"Docs: {size:>8}"
+        for name, analyzer in chains.items():
+            start = time.perf_counter()
+            BM25Okapi(corpus, analyzer=analyzer)
+            line += f"\t{name}: {size / (time.perf_counter() - start):8.0f} docs/s"
+        print(line)
+
+        cached = BM25Okapi(corpus)
+        uncached = BM25Okapi(corpus, analyzer=Analyzer(query_cache_size=0))
+        cached_ms = time_queries(lambda q: cached.get_top_n(q, 10), queries)
+        uncached_ms = time_queries(lambda q: uncached.get_top_n(q, 10), queries)
+        info = cached.analyzer.analyze_query.cache_info()
+        print(f"\tQuery cache off: {uncached_ms:6.3f} ms/query\ton: {cached_ms:6.3f} ms/query"
+              f"\thit rate: {info.hits / (info.hits + info.misses):.0%}")
+
+def benchmark_sharded(sizes, n_queries=200, n=10):
+    """Compares a single index against scatter-gather over shard processes."""
+    print(f"--- Single BM25Okapi vs ShardedBM25 (top {n}) ---")
+    queries = generate_queries(n_queries) + [f"term0 term1 term{i}" for i in range(100, 100 + n_queries)]
+    shard_counts = sorted({2, 4, os.cpu_count() or 1} - {1})
+    for size in sizes:
+        corpus = generate_corpus(size)
+        single = BM25Okapi(corpus)
+        single_ms = time_queries(lambda q: single.get_top_n(q, n), queries)
+        line = f"Docs: {size:>8}\tSingle: {single_ms:6.2f} ms"
+        for n_shards in shard_counts:
+            with ShardedBM25(corpus, n_shards=n_shards) as sharded:
+                for query in queries[:20]:
+                    assert sharded.get_top_n(query, n) == single.get_top_n(query, n), "Sharded results differ"
+                sharded_ms = time_queries(lambda q: sharded.get_top_n(q, n), queries)
+            line += f"\t{n_shards} shards: {sharded_ms:6.2f} ms"
+        print(line)
+
+def benchmark_variants(sizes, n_queries=200, n=10, title_len=8):
+    """
+    Indexes once with every BM25 variant precomputed, then scores with each.
+
+    Documents are split into a title (their first title_len tokens) and a
+    body so BM25F has fields to weight. The build is compared against an
+    Okapi-only index to show what the extra variants add at index time.
+    """
+    print(f"--- BM25 variants on one shared index (top {n}) ---")
+    queries = generate_queries(n_queries)
+    field_weights = {'title': 2.0, 'body': 1.0}
+    for size in sizes:
+        corpus = []
+        for doc in generate_corpus(size):
+            tokens = doc.split()
+            corpus.append({'title': " ".join(tokens[:title_len]), 'body': " ".join(tokens[title_len:])})
+
+        start = time.perf_counter()
+        okapi_only = BM25Sparse(corpus, field_weights=field_weights)
+        okapi_build = time.perf_counter() - start
+        start = time.perf_counter()
+        index = BM25Sparse(corpus, variants=BM25Sparse.VARIANTS, field_weights=field_weights)
+        all_build = time.perf_counter() - start
+
+        for query in queries[:5]:
+            assert (okapi_only.get_scores(query) == index.get_scores(query)).all(), "Okapi scores changed"
+
+        # An empty field with field b = 1.0 must not turn BM25F scores into NaN
+        edge = BM25Sparse([{'title': '', 'body': 'alpha beta'}, {'title': 'beta', 'body': 'gamma'}],
+                          variants=('bm25f',), field_weights=field_weights, field_b={'title': 1.0})
+        edge_top = edge.get_top_n("alpha", 2, variant='bm25f')
+        assert not any(math.isnan(score) for score in edge.get_scores("alpha", variant='bm25f')), "BM25F produced NaN"
+        assert edge_top[0][0]['body'] == 'alpha beta', "BM25F misranked a doc with an empty field"
+
+        line = f"Docs: {size:>8}\tBuild: okapi {okapi_build:5.2f} s, all variants {all_build:5.2f} s"
+        for variant in BM25Sparse.VARIANTS:
+            variant_ms = time_queries(lambda q: index.get_top_n(q, n, variant=variant), queries)
+            line += f"\t{variant}: {variant_ms:5.2f} ms"
+        print(line)
+
+if __name__ == '__main__':
+    # Corpus sizes can be passed on the command line, e.g. `python bm25_benchmark.py 10000 100000`
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 50000]
+
+    benchmark_inverted_index(sizes)
+    benchmark_sparse_backend(sizes)
+    benchmark_top_n(sizes)
+    benchmark_incremental_updates(sizes)
+    benchmark_persistence(sizes)
+    benchmark_parallel_build(sizes)
+    benchmark_batch_queries(sizes)
+    benchmark_analyzers(sizes)
+    benchmark_sharded(sizes)
+    benchmark_variants(sizes)
@@ -0,0 +1,257 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from caching_example import AsyncTimedLRUCache, DiskCache, ShardedTimedLRUCache, TimedLRUCache
+
+def slow_loader(delay):
+    """Returns a loader that sleeps for delay seconds (a slow backend) and counts its calls per key."""
+    calls = Counter()
+    lock = threading.Lock()
+
+    def load(key):
+        with lock:
+            calls[key] += 1
+        time.sleep(delay)
+        return {"key": key}
+
+    load.calls = calls
+    return load
+
+def key_stream(n_ops, n_keys, miss_rate, seed):
+    """Keys for one worker: mostly hot keys, plus a miss_rate share of never-seen keys."""
+    rng = random.Random(seed)
+    return [f"cold-{seed}-{i}" if rng.random() < miss_rate else f"hot-{rng.randrange(n_keys)}" for i in range(n_ops)]
+
+def run_threads(get, n_threads, n_ops, n_keys, miss_rate):
+    """Runs n_threads workers doing n_ops gets each; returns operations per second."""
+    streams = [key_stream(n_ops, n_keys, miss_rate, seed) for seed in range(n_threads)]
+
+    def worker(keys):
+        for key in keys:
+            get(key)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        list(pool.map(worker, streams))
+    return n_threads * n_ops / (time.perf_counter() - start)
+
+def benchmark_single_flight(thread_counts=(1, 2, 4, 8, 16, 32), n_ops=2000, n_keys=100, miss_rate=0.01, delay=0.01):
+    """
+    Throughput of a hit-heavy workload with occasional slow misses.
+
+    "serialized" holds one lock around the whole get, as TimedLRUCache did
+    before single-flight loading; "single-flight" is the current class.
+    """
+    print(f"--- Single-flight loading ({miss_rate:.0%} misses, {delay * 1000:.0f} ms loader) ---")
+    for n_threads in thread_counts:
+        line = f"Threads: {n_threads:>3}"
+        for label in ("serialized", "single-flight"):
+            cache = TimedLRUCache(max_size=n_keys * 100, ttl=60, verbose=False)
+            loader = slow_loader(delay)
+            for i in range(n_keys):
+                cache.get(f"hot-{i}", lambda key: {"key": key})
+
+            if label == "serialized":
+                serial_lock = threading.Lock()
+
+                def get(key, cache=cache, loader=loader, serial_lock=serial_lock):
+                    with serial_lock:
+                        return cache.get(key, loader)
+            else:
+                def get(key, cache=cache, loader=loader):
+                    return cache.get(key, loader)
+
+            ops = run_threads(get, n_threads, n_ops, n_keys, miss_rate)
+            line += f"\t{label}: {ops:10.0f} ops/s"
+        print(line)
+
+    # Stampede check: many threads miss the same key at once
+    cache = TimedLRUCache(max_size=10, ttl=60, verbose=False)
+    loader = slow_loader(0.2)
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        list(pool.map(lambda _: cache.get("same-key", loader), range(64)))
+    print(f"64 concurrent misses on one key -> {loader.calls['same-key']} loader call(s)")
+
+def make_cache(kind, max_size, n_shards=16):
+    if kind == "sharded":
+        return ShardedTimedLRUCache(max_size=max_size, ttl=60, n_shards=n_shards)
+    return TimedLRUCache(max_size=max_size, ttl=60, verbose=False)
+
+def hit_workload(kind, n_threads, n_ops, n_keys, miss_rate=0.0):
+    """Builds a warmed cache and returns the ops/s of n_threads workers on it."""
+    cache = make_cache(kind, max_size=n_keys * 2)
+    fill = lambda key: {"key": key}
+    for i in range(n_keys):
+        cache.get(f"hot-{i}", fill)
+    return run_threads(lambda key: cache.get(key, fill), n_threads, n_ops, n_keys, miss_rate)
+
+def _process_worker(args):
+    return hit_workload(*args)
+
+def benchmark_sharded(thread_counts=(1, 4, 16), process_counts=(1, 2, 4), n_ops=20000, n_keys=1000):
+    """
+    Hit-path throughput of one globally locked cache versus the lock-striped one.
+
+    The multi-process runs start one cache per process (each process runs
+    4 threads) and report the aggregate rate, which is how a pre-forked
+    web server would use it.
+    """
+    print("--- TimedLRUCache vs ShardedTimedLRUCache (16 shards), hits only ---")
+    for n_threads in thread_counts:
+        line = f"Threads: {n_threads:>3}"
+        for kind in ("single", "sharded"):
+            line += f"\t{kind}: {hit_workload(kind, n_threads, n_ops, n_keys):10.0f} ops/s"
+        print(line)
+
+    context = multiprocessing.get_context()
+    for n_procs in process_counts:
+        line = f"Processes: {n_procs:>2} x 4 threads"
+        for kind in ("single", "sharded"):
+            with context.Pool(n_procs) as pool:
+                rates = pool.map(_process_worker, [(kind, 4, n_ops, n_keys)] * n_procs)
+            line += f"\t{kind}: {sum(rates):10.0f} ops/s"
+        print(line)
+
+    # Per-shard counters after a mixed workload
+    cache = make_cache("sharded", max_size=256)
+    run_threads(lambda key: cache.get(key, lambda k: k), 4, 2000, 300, 0.05)
+    totals = cache.stats()["total"]
+    print(f"Sharded counters: {totals} (max_size 256, limit {cache.shards[0].max_size * cache.n_shards})")
+
+def benchmark_expiry(max_size=1000, n_short=500, n_rounds=5, short_ttl=0.05, long_ttl=60):
+    """
+    Mixed-TTL workload: each round loads short-lived entries, lets them
+    expire, then loads long-lived ones. Live entries never exceed max_size,
+    so with expired entries removed in expiry order no long-lived key should
+    be evicted; without it the dead entries would fill the cache and force
+    the oldest long-lived keys out.
+    """
+    print(f"--- Proactive expiration ({n_short} short-TTL + long-TTL keys per round, max_size {max_size}) ---")
+    n_long = (max_size - n_short) // n_rounds
+    cache = TimedLRUCache(max_size=max_size, ttl=long_ttl, verbose=False)
+    fill = lambda key: {"key": key}
+    for r in range(n_rounds):
+        for i in range(n_short):
+            cache.get(f"short-{r}-{i}", fill, ttl=short_ttl)
+        time.sleep(short_ttl * 2)
+        for i in range(n_long):
+            cache.get(f"long-{r}-{i}", fill)
+    long_kept = sum(key.startswith("long-") for key in cache.cache)
+    stats = cache.stats()
+    print(f"Long-TTL keys still cached: {long_kept}/{n_long * n_rounds}, "
+          f"expirations {stats['expirations']}, evictions {stats['evictions']}, heap {len(cache.expiry_heap)}")
+
+    # Byte bound with values of varying size
+    cache = TimedLRUCache(max_size=10 ** 6, ttl=long_ttl, verbose=False, max_bytes=1 << 20)
+    rng = random.Random(0)
+    for i in range(5000):
+        cache.get(i, lambda key: "x" * rng.randrange(100, 2000))
+    stats = cache.stats()
+    print(f"max_bytes 1 MiB: {stats['size']} entries, {stats['bytes']} bytes, evictions {stats['evictions']}")
+
+    # Idle cache emptied by the sweeper thread
+    cache = TimedLRUCache(max_size=max_size, ttl=short_ttl, verbose=False, sweep_interval=short_ttl / 2)
+    for i in range(max_size):
+        cache.get(i, fill)
+    time.sleep(short_ttl * 3)
+    print(f"Sweeper: {cache.stats()['size']} entries left {short_ttl * 3:.2f} s after {max_size} inserts with no reads")
+    cache.stop_sweeper()
+
+def skewed_keys(n_ops, n_keys, seed):
+    """Key stream skewed toward low key numbers, so some keys repeat often and many are rare."""
+    rng = random.Random(seed)
+    return [f"key-{int(n_keys * rng.random() ** 2)}" for _ in range(n_ops)]
+
+def tiered_workload(path, keys, max_size, delay, serializer="pickle"):
+    """Runs keys through a fresh TimedLRUCache (disk tier at path if given); returns its stats plus loader calls."""
+    disk = DiskCache(path, serializer=serializer) if path else None
+    cache = TimedLRUCache(max_size=max_size, ttl=600, verbose=False, disk=disk)
+    loader = slow_loader(delay)
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key, loader)
+    stats = cache.stats()
+    stats["loader_calls"] = sum(loader.calls.values())
+    stats["seconds"] = time.perf_counter() - start
+    stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / len(keys)
+    return stats
+
+def _tiered_process_worker(args):
+    return tiered_workload(*args)
+
+def benchmark_disk_tier(n_ops=5000, n_keys=2000, max_size=500, delay=0.001, n_procs=4):
+    """
+    Startup and cross-process hit rates with the SQLite disk tier.
+
+    "startup" is a restarted process replaying the same key stream after
+    a previous one warmed the cache; "cross-process" is n_procs processes
+    running at once against one shared file, each with its own stream
+    drawn from the same key distribution. Memory-only caches start
+    cold every time, so their hit rate only comes from repeats within the run.
+    """
+    print(f"--- Disk tier ({n_keys} keys, memory max_size {max_size}, {delay * 1000:.0f} ms loader) ---")
+    keys = skewed_keys(n_ops, n_keys, seed=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        for label, disk_path in (("memory only", None), ("memory + disk", path)):
+            tiered_workload(disk_path, keys, max_size, delay)  # previous process, before the restart
+            stats = tiered_workload(disk_path, keys, max_size, delay)
+            print(f"Startup, {label:>13}: hit rate {stats['hit_rate']:6.1%} "
+                  f"(disk hits {stats['disk_hits']}, loader calls {stats['loader_calls']}, {stats['seconds']:.2f} s)")
+
+        context = multiprocessing.get_context()
+        for label, disk_path in (("memory only", None), ("memory + disk", os.path.join(tmp, "shared.sqlite3"))):
+            if disk_path:
+                DiskCache(disk_path)  # create the schema before the workers race to it
+            with context.Pool(n_procs) as pool:
+                results = pool.map(_tiered_process_worker,
+                                   [(disk_path, skewed_keys(n_ops, n_keys, seed), max_size, delay)
+                                    for seed in range(1, n_procs + 1)])
+            hit_rate = sum(r["hit_rate"] for r in results) / n_procs
+            loader_calls = sum(r["loader_calls"] for r in results)
+            disk_hits = sum(r["disk_hits"] for r in results)
+            print(f"Cross-process ({n_procs}), {label:>13}: hit rate {hit_rate:6.1%} "
+                  f"(disk hits {disk_hits}, loader calls {loader_calls})")
+
+async def benchmark_async(n_tasks=1000, delay=0.05, ttl=0.2):
+    """
+    Coalescing and stale-while-revalidate on AsyncTimedLRUCache.
+
+    Reports loader calls for n_tasks concurrent misses on one key, then the
+    read latency right after expiry with and without stale-while-revalidate.
+    """
+    print(f"--- AsyncTimedLRUCache ({delay * 1000:.0f} ms async loader) ---")
+    calls = Counter()
+
+    async def load(key):
+        calls[key] += 1
+        await asyncio.sleep(delay)
+        return {"key": key}
+
+    cache = AsyncTimedLRUCache(max_size=10, ttl=60)
+    await asyncio.gather(*(cache.get("same-key", load) for _ in range(n_tasks)))
+    print(f"{n_tasks} concurrent misses on one key -> {calls['same-key']} loader call(s)")
+
+    for swr in (0, 5):
+        cache = AsyncTimedLRUCache(max_size=10, ttl=ttl, stale_while_revalidate=swr)
+        await cache.get("key", load)
+        await asyncio.sleep(ttl * 1.5)
+        start = time.perf_counter()
+        await cache.get("key", load)
+        elapsed = time.perf_counter() - start
+        print(f"stale_while_revalidate={swr}: read after expiry took {elapsed * 1000:7.3f} ms")
+
+if __name__ == '__main__':
+    benchmark_single_flight()
+    benchmark_sharded()
+    benchmark_expiry()
+    benchmark_disk_tier()
+    asyncio.run(benchmark_async())
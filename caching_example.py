@@ -1,47 +1,442 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+import sys
 import time
 import threading
 from collections import OrderedDict
+from concurrent.futures import Future
+
+def approx_sizeof(obj):
+    """Approximate memory footprint of obj in bytes, following dicts, lists, tuples and sets."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_sizeof(k) + approx_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_sizeof(item) for item in obj)
+    return size
+
+# Value serializers for DiskCache; any object with dumps/loads works too
+SERIALIZERS = {"pickle": pickle, "json": json}
+
+class DiskCache:
+    """
+    SQLite-backed cache tier shared by every process on the host that opens the same file.
+
+    Expiry is stored as wall-clock time, since the monotonic clock is
+    per-boot and the file outlives processes. The database runs in WAL mode
+    so readers in other processes are not blocked by a writer. Each thread
+    (and each process after a fork) gets its own connection.
+    """
+
+    def __init__(self, path="cache.sqlite3", serializer="pickle", timeout=30):
+        """
+        path: SQLite file; processes sharing it share the cache
+        serializer: "pickle", "json", or an object with dumps/loads
+        timeout: seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.serializer = SERIALIZERS[serializer] if isinstance(serializer, str) else serializer
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connect().execute("CREATE TABLE IF NOT EXISTS entries "
+                                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+        self._connect().execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return repr(key)
+
+    def get(self, key):
+        """Returns (value, remaining_ttl) if key is stored and not expired, else None."""
+        row = self._connect().execute("SELECT value, expires_at FROM entries WHERE key = ?",
+                                      (self._key(key),)).fetchone()
+        if row is None:
+            return None
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            self._connect().execute("DELETE FROM entries WHERE key = ? AND expires_at = ?", (self._key(key), row[1]))
+            return None
+        return self.serializer.loads(row[0]), remaining
+
+    def set(self, key, value, ttl):
+        """Stores value for ttl seconds, replacing any existing entry."""
+        self._connect().execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                                (self._key(key), self.serializer.dumps(value), time.time() + ttl))
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+
+    def purge_expired(self):
+        """Deletes expired rows; returns how many were deleted."""
+        return self._connect().execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def clear(self):
+        self._connect().execute("DELETE FROM entries")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        """Closes this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
 class TimedLRUCache:
-    def __init__(self, max_size=5, ttl=10):
+    def __init__(self, max_size=5, ttl=10, verbose=True, max_bytes=None, sizeof=approx_sizeof, sweep_interval=None,
+                 disk=None, write_through=True):
         """
         max_size: maximum number of items in cache
-        ttl: time-to-live in seconds
+        ttl: default time-to-live in seconds (measured on the monotonic clock)
+        verbose: print hits, misses and evictions
+        max_bytes: optional bound on the summed sizeof() of cached values
+        sizeof: function giving a value's size in bytes, used with max_bytes
+        sweep_interval: if set, a daemon thread removes expired entries every sweep_interval seconds
+        disk: optional DiskCache second tier; memory misses are looked up there
+            before calling fallback_fn, and entries evicted for capacity spill to it
+        write_through: also write freshly loaded values to disk, so other processes
+            and later restarts see them without waiting for an eviction
         """
-        self.cache = OrderedDict()
+        self.cache = OrderedDict()  # key -> (value, expires_at, size)
         self.ttl = ttl
         self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.verbose = verbose
+        self.disk = disk
+        self.write_through = write_through
         self.lock = threading.Lock()
+        # key -> Future of the load in progress, so concurrent misses share one fallback_fn call
+        self.in_flight = {}
+        # Min-heap of (expires_at, seq, key); entries for keys that were since evicted or replaced are skipped when popped
+        self.expiry_heap = []
+        self._seq = itertools.count()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+        if sweep_interval:
+            self.start_sweeper(sweep_interval)
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def _is_expired(self, expires_at):
+        # Monotonic time cannot jump when the wall clock is adjusted
+        return time.monotonic() >= expires_at
 
-    def _is_expired(self, entry_time):
-        return (time.time() - entry_time) > self.ttl
+    def _remove(self, key):
+        _, _, size = self.cache.pop(key)
+        self.bytes -= size
 
-    def get(self, key, fallback_fn):
+    def _expire(self, now):
+        """Drops every entry whose expiry has passed. Caller holds the lock."""
+        removed = 0
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, _, key = heapq.heappop(heap)
+            entry = self.cache.get(key)
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key)
+                self.expirations += 1
+                removed += 1
+                self._log(f"Expired {key} from cache")
+        # Rebuild once evicted/replaced keys leave the heap mostly stale
+        if len(heap) > 2 * len(self.cache) + 64:
+            self.expiry_heap = [(entry[1], next(self._seq), key) for key, entry in self.cache.items()]
+            heapq.heapify(self.expiry_heap)
+        return removed
+
+    def get(self, key, fallback_fn, ttl=None):
         """
         Returns cached value if valid, else uses fallback_fn to fetch, store and return it.
+
+        The lock is not held while fallback_fn runs, so a slow load never
+        blocks reads of other keys. Concurrent misses for the same key are
+        coalesced: the first caller runs fallback_fn and the others wait for
+        its result (or its exception). Every call first drops the entries
+        that have expired, in expiry order. With a disk tier, a memory miss
+        is served from disk when possible, keeping the entry's remaining TTL.
+
+        ttl: time-to-live in seconds for this entry if it is loaded, instead of the cache default
         """
         with self.lock:
+            self._expire(time.monotonic())
             if key in self.cache:
-                value, timestamp = self.cache[key]
-                if not self._is_expired(timestamp):
-                    print(f"Cache hit for {key}")
+                value, expires_at, _ = self.cache[key]
+                if not self._is_expired(expires_at):
+                    self._log(f"Cache hit for {key}")
+                    self.hits += 1
                     # Move to end to show it's recently used
                     self.cache.move_to_end(key)
                     return value
                 else:
-                    print(f"Cache expired for {key}")
-                    del self.cache[key]
+                    self._log(f"Cache expired for {key}")
+                    self._remove(key)
+                    self.expirations += 1
+
+            self.misses += 1
+            future = self.in_flight.get(key)
+            if future is None:
+                # This caller loads the key; later callers wait on its future
+                future = self.in_flight[key] = Future()
+                loader = True
+            else:
+                loader = False
+
+        if not loader:
+            self._log(f"Cache miss for {key}, waiting for in-flight fetch...")
+            return future.result()
 
-            print(f"Cache miss for {key}, fetching fresh data...")
-            value = fallback_fn(key)
-            self.cache[key] = (value, time.time())
+        try:
+            stored = self.disk.get(key) if self.disk is not None else None
+            if stored is not None:
+                self._log(f"Disk hit for {key}")
+                value, entry_ttl = stored
+            else:
+                self._log(f"Cache miss for {key}, fetching fresh data...")
+                value = fallback_fn(key)
+                entry_ttl = self.ttl if ttl is None else ttl
+            size = self.sizeof(value) if self.max_bytes is not None else 0
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        spilled = []
+        with self.lock:
+            if stored is not None:
+                self.disk_hits += 1
+            now = time.monotonic()
+            expires_at = now + entry_ttl
+            self.cache[key] = (value, expires_at, size)
             self.cache.move_to_end(key)
+            self.bytes += size
+            heapq.heappush(self.expiry_heap, (expires_at, next(self._seq), key))
+            del self.in_flight[key]
+
+            # Expired entries go first, so capacity evictions only take live ones when the cache is really full
+            self._expire(now)
+            while self.cache and (len(self.cache) > self.max_size or
+                                  (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                evicted = next(iter(self.cache))  # The least recently used item
+                if self.disk is not None and not self.write_through:
+                    spilled.append((evicted, self.cache[evicted][0], self.cache[evicted][1] - now))
+                self._remove(evicted)
+                self.evictions += 1
+                self._log(f"Evicted {evicted} from cache")
+
+        future.set_result(value)
+
+        # Disk writes happen outside the lock and after waiters are released
+        if self.disk is not None:
+            if stored is None and self.write_through:
+                self.disk.set(key, value, entry_ttl)
+            for evicted, evicted_value, remaining in spilled:
+                if remaining > 0:
+                    self.disk.set(evicted, evicted_value, remaining)
+        return value
+
+    def sweep(self):
+        """Removes all expired entries now (in both tiers); returns how many were removed from memory."""
+        with self.lock:
+            removed = self._expire(time.monotonic())
+        if self.disk is not None:
+            self.disk.purge_expired()
+        return removed
+
+    def start_sweeper(self, interval):
+        """Starts a daemon thread that calls sweep() every interval seconds, so idle caches release expired entries."""
+        if self._sweeper is not None:
+            return
+        self._stop_sweeper.clear()
+
+        def run():
+            while not self._stop_sweeper.wait(interval):
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name="TimedLRUCache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """Stops the background sweeper thread, if running."""
+        if self._sweeper is not None:
+            self._stop_sweeper.set()
+            self._sweeper.join()
+            self._sweeper = None
+
+    def stats(self):
+        """
+        Returns hit/miss/eviction/expiration counters, the current size and the tracked bytes.
+        misses counts memory misses; disk_hits is the part of them served by the disk tier.
+        """
+        with self.lock:
+            return {"size": len(self.cache), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                    "disk_hits": self.disk_hits, "evictions": self.evictions, "expirations": self.expirations}
+
+class ShardedTimedLRUCache:
+    """
+    TimedLRUCache split into independently locked shards (lock striping).
 
-            if len(self.cache) > self.max_size:
-                evicted = self.cache.popitem(last=False)  # Pop the least recently used item
-                print(f"Evicted {evicted[0]} from cache")
+    Keys are hashed to one of n_shards segments, each a TimedLRUCache with
+    its own lock, LRU order and counters, so threads touching different
+    keys rarely contend. Capacity is enforced per shard: each holds at most
+    ceil(max_size / n_shards) entries, so the total never exceeds
+    max_size + n_shards - 1, but a shard can evict while others have room.
+    """
+
+    def __init__(self, max_size=1024, ttl=10, n_shards=16, verbose=False, max_bytes=None, sizeof=approx_sizeof,
+                 disk=None, write_through=True):
+        """
+        max_size: approximate maximum number of items across all shards
+        ttl: default time-to-live in seconds
+        n_shards: number of independently locked segments
+        verbose: print hits, misses and evictions
+        max_bytes: optional byte bound across all shards, split evenly between them
+        sizeof: function giving a value's size in bytes, used with max_bytes
+        disk: optional DiskCache shared by all shards as the second tier
+        write_through: also write freshly loaded values to disk
+        """
+        self.n_shards = n_shards
+        self.max_size = max_size
+        shard_size = max(1, -(-max_size // n_shards))
+        shard_bytes = None if max_bytes is None else max_bytes // n_shards
+        self.shards = [TimedLRUCache(max_size=shard_size, ttl=ttl, verbose=verbose, max_bytes=shard_bytes, sizeof=sizeof,
+                                     disk=disk, write_through=write_through)
+                       for _ in range(n_shards)]
 
-            return value
+    def _shard(self, key):
+        return self.shards[hash(key) % self.n_shards]
+
+    def get(self, key, fallback_fn, ttl=None):
+        """
+        Returns cached value if valid, else uses fallback_fn to fetch, store and return it.
+        """
+        return self._shard(key).get(key, fallback_fn, ttl)
+
+    def sweep(self):
+        """Removes all expired entries from every shard; returns how many were removed."""
+        return sum(shard.sweep() for shard in self.shards)
+
+    def stats(self):
+        """Returns per-shard counters and their totals."""
+        per_shard = [shard.stats() for shard in self.shards]
+        totals = {name: sum(stats[name] for stats in per_shard) for name in ("size", "bytes", "hits", "misses", "disk_hits", "evictions", "expirations")}
+        return {"shards": per_shard, "total": totals}
+
+class AsyncTimedLRUCache:
+    """
+    asyncio counterpart of TimedLRUCache for async loaders.
+
+    Concurrent misses for a key share one loader task. With
+    stale_while_revalidate > 0, an entry that expired less than that many
+    seconds ago is still returned immediately while a background task
+    reloads it, so callers never wait on a refresh. It is meant for one
+    event loop, so no locks are needed.
+    """
+
+    def __init__(self, max_size=5, ttl=10, stale_while_revalidate=0, verbose=False):
+        """
+        max_size: maximum number of items in cache
+        ttl: time-to-live in seconds (measured on the monotonic clock)
+        stale_while_revalidate: seconds after expiry during which the old value
+            is served while being refreshed in the background (0 disables)
+        verbose: print hits, misses and evictions
+        """
+        self.cache = OrderedDict()
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_while_revalidate = stale_while_revalidate
+        self.verbose = verbose
+        # key -> Task of the load in progress
+        self.in_flight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    async def get(self, key, async_loader):
+        """
+        Returns the cached value if fresh (or stale but revalidating), else
+        awaits async_loader(key), shared with any concurrent callers.
+        """
+        entry = self.cache.get(key)
+        if entry is not None:
+            value, timestamp = entry
+            age = time.monotonic() - timestamp
+            if age <= self.ttl:
+                self._log(f"Cache hit for {key}")
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return value
+            if age <= self.ttl + self.stale_while_revalidate:
+                self._log(f"Cache stale for {key}, refreshing in background")
+                self.stale_hits += 1
+                self.cache.move_to_end(key)
+                self._start_load(key, async_loader, background=True)
+                return value
+            self._log(f"Cache expired for {key}")
+            del self.cache[key]
+
+        self._log(f"Cache miss for {key}, fetching fresh data...")
+        self.misses += 1
+        # shield: a cancelled caller must not cancel the load other callers are waiting on
+        return await asyncio.shield(self._start_load(key, async_loader))
+
+    def _start_load(self, key, async_loader, background=False):
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(key, async_loader))
+            self.in_flight[key] = task
+            if background:
+                # Nobody awaits a background refresh; retrieve its exception so it is not reported as lost
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _load(self, key, async_loader):
+        try:
+            value = await async_loader(key)
+        finally:
+            del self.in_flight[key]
+
+        self.cache[key] = (value, time.monotonic())
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.max_size:
+            evicted = self.cache.popitem(last=False)  # Pop the least recently used item
+            self.evictions += 1
+            self._log(f"Evicted {evicted[0]} from cache")
+        return value
+
+    def stats(self):
+        """Returns hit/stale-hit/miss/eviction counters and the current size."""
+        return {"size": len(self.cache), "hits": self.hits, "stale_hits": self.stale_hits,
+                "misses": self.misses, "evictions": self.evictions}
 
 # Simulated slow data source
 def fetch_user_profile(user_id):
@@ -49,6 +444,26 @@ def fetch_user_profile(user_id):
     time.sleep(1)
     return {"user_id": user_id, "name": f"User{user_id}", "profile": f"Profile of user {user_id}"}
 
+# Simulated slow async data source
+async def fetch_user_profile_async(user_id):
+    print(f"Fetching data for user {user_id} (async)...")
+    await asyncio.sleep(1)
+    return {"user_id": user_id, "name": f"User{user_id}", "profile": f"Profile of user {user_id}"}
+
+async def async_demo():
+    cache = AsyncTimedLRUCache(max_size=3, ttl=2, stale_while_revalidate=5, verbose=True)
+
+    print("\n-- Five concurrent requests for item 1 share one fetch --")
+    await asyncio.gather(*(cache.get(1, fetch_user_profile_async) for _ in range(5)))
+
+    print("\n-- Wait for TTL to expire, then read: stale value returned at once, refreshed in background --")
+    await asyncio.sleep(3)
+    start = time.monotonic()
+    print(await cache.get(1, fetch_user_profile_async), f"({time.monotonic() - start:.3f} s)")
+    await asyncio.sleep(1.5)
+    print(await cache.get(1, fetch_user_profile_async))
+    print(cache.stats())
+
 # Main block
 if __name__ == "__main__":
     cache = TimedLRUCache(max_size=3, ttl=5)  # small size and TTL for demo
@@ -67,3 +482,5 @@ if __name__ == "__main__":
 
     print("\n-- Access expired item (item 2) --")
     print(cache.get(2, fetch_user_profile))
+
+    asyncio.run(async_demo())
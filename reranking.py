@@ -1,4 +1,8 @@
 from sentence_transformers import CrossEncoder
+from BM25 import BM25Okapi
+import math
+import numpy as np
+import random
 import time
 
 def load_model(model_name):
@@ -14,11 +18,221 @@ def create_query_document_pairs(query, documents):
     print("Creating query-document pairs...")
     return [[query, doc] for doc in documents]
 
-def rerank_documents(model, query_document_pairs):
+class Reranker:
+    """
+    Reusable cross-encoder reranker for large candidate sets.
+
+    Pairs are sorted by token length before batching, so every batch holds
+    pairs of similar length and little compute is spent on padding. Batches
+    are capped both by pair count and, optionally, by a token budget (many
+    short pairs or few long ones). Scores are mapped back to the input
+    order, and the top k are picked by partial selection instead of a full
+    sort.
+    """
+
+    def __init__(self, model, batch_size=32, max_batch_tokens=None, bucket=True):
+        """
+        Args:
+            model (CrossEncoder): The cross-encoder.
+            batch_size (int, optional): Maximum pairs per forward pass. Defaults to 32.
+            max_batch_tokens (int, optional): Maximum padded tokens (longest pair
+                times pair count) per forward pass. Defaults to no limit.
+            bucket (bool, optional): Sort pairs by length before batching.
+                Defaults to True; False keeps input order (for comparison).
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.bucket = bucket
+        self.tokenizer = getattr(model, "tokenizer", None)
+        self.max_length = getattr(model, "max_length", None) or 512
+
+    def pair_lengths(self, query, documents):
+        """Token count of each (query, document) pair, capped at the model's max length."""
+        if self.tokenizer is None:
+            # No tokenizer available: whitespace word count is a close enough proxy for ordering
+            query_len = len(query.split())
+            return np.array([min(query_len + len(doc.split()) + 3, self.max_length) for doc in documents])
+        # One batched (Rust) tokenizer call; much cheaper than the forward passes it saves
+        query_len = len(self.tokenizer(query, add_special_tokens=False)["input_ids"])
+        doc_ids = self.tokenizer(documents, add_special_tokens=False, truncation=True,
+                                 max_length=self.max_length)["input_ids"]
+        return np.minimum(np.array([len(ids) for ids in doc_ids]) + query_len + 3, self.max_length)
+
+    def batches(self, lengths):
+        """Splits candidate indices into batches, in bucketed (length-sorted) or input order."""
+        order = np.argsort(lengths, kind="stable") if self.bucket else np.arange(len(lengths))
+        batch = []
+        batch_max_len = 0
+        for idx in order:
+            longest = max(batch_max_len, lengths[idx])
+            too_many_tokens = self.max_batch_tokens and longest * (len(batch) + 1) > self.max_batch_tokens
+            if batch and (len(batch) == self.batch_size or too_many_tokens):
+                yield batch
+                batch, longest = [], lengths[idx]
+            batch.append(idx)
+            batch_max_len = longest
+        if batch:
+            yield batch
+
+    def score(self, query, documents):
+        """
+        Scores every document against the query.
+
+        Returns:
+            numpy.ndarray: One score per document, in input order.
+        """
+        scores = np.empty(len(documents), dtype=np.float32)
+        if not documents:
+            return scores
+        lengths = self.pair_lengths(query, documents)
+        for batch in self.batches(lengths):
+            pairs = [[query, documents[idx]] for idx in batch]
+            scores[batch] = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        return scores
+
+    def rerank(self, query, documents, top_k=None):
+        """
+        Reranks documents for a query.
+
+        Args:
+            query (str): The query.
+            documents (list of str): Candidate documents.
+            top_k (int, optional): Number of results. Defaults to all documents.
+
+        Returns:
+            list of tuple: (document, score) pairs, best first.
+        """
+        scores = self.score(query, documents)
+        top_k = len(documents) if top_k is None else min(top_k, len(documents))
+        if top_k <= 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(documents[idx], float(scores[idx])) for idx in top]
+
+def rerank_documents(model, query_document_pairs, top_k=None, batch_size=32):
     """Predict relevance scores and sort documents."""
     print("Predicting relevance scores...")
-    scores = model.predict(query_document_pairs)
-    return sorted(zip(documents, scores), key=lambda x: x[1], reverse=True)
+    query = query_document_pairs[0][0] if query_document_pairs else ""
+    documents = [doc for _, doc in query_document_pairs]
+    return Reranker(model, batch_size=batch_size).rerank(query, documents, top_k)
+
+class CascadeReranker:
+    """
+    Two-stage reranker: a cheap first stage scores every candidate, and only
+    the best fraction of them is passed to the full cross-encoder.
+
+    The first stage is either "bm25" (BM25Okapi over the candidate pool, so
+    IDF reflects the pool rather than the whole collection) or any object
+    with a score(query, documents) method, such as a Reranker wrapping a
+    tiny cross-encoder. Candidates exit early if they fall outside the kept
+    fraction or below min_first_stage_score.
+    """
+
+    def __init__(self, full_reranker, first_stage="bm25", keep_fraction=0.2, min_keep=20,
+                 min_first_stage_score=None):
+        """
+        Args:
+            full_reranker (Reranker): The expensive reranker for the final stage.
+            first_stage (str or Reranker, optional): "bm25" or a cheap reranker. Defaults to "bm25".
+            keep_fraction (float, optional): Fraction of candidates passed on. Defaults to 0.2.
+            min_keep (int, optional): Candidates always passed on (if available),
+                however small the pool. Defaults to 20.
+            min_first_stage_score (float, optional): Candidates scoring below this
+                in the first stage are dropped even inside the kept fraction.
+        """
+        self.full_reranker = full_reranker
+        self.first_stage = first_stage
+        self.keep_fraction = keep_fraction
+        self.min_keep = min_keep
+        self.min_first_stage_score = min_first_stage_score
+
+    def first_stage_scores(self, query, documents):
+        if self.first_stage == "bm25":
+            return np.asarray(BM25Okapi(documents).get_scores(query), dtype=np.float32)
+        return np.asarray(self.first_stage.score(query, documents), dtype=np.float32)
+
+    def survivors(self, query, documents, top_k=None):
+        """Indices of the candidates the first stage passes to the full reranker."""
+        scores = self.first_stage_scores(query, documents)
+        keep = max(math.ceil(self.keep_fraction * len(documents)), self.min_keep, top_k or 0)
+        keep = min(keep, len(documents))
+        if keep <= 0:
+            return np.empty(0, dtype=np.int64)
+        kept = np.argpartition(-scores, keep - 1)[:keep]
+        if self.min_first_stage_score is not None:
+            kept = kept[scores[kept] >= self.min_first_stage_score]
+        return kept
+
+    def rerank(self, query, documents, top_k=10):
+        """
+        Reranks documents, running the full cross-encoder on first-stage survivors only.
+
+        Returns:
+            list of tuple: (document, score) pairs, best first. Scores are full
+            cross-encoder scores.
+        """
+        kept = self.survivors(query, documents, top_k)
+        return self.full_reranker.rerank(query, [documents[idx] for idx in kept], top_k)
+
+def ndcg_at_k(ranked_documents, relevance, k=10):
+    """
+    NDCG@k of a ranking given graded relevance per document.
+
+    Args:
+        ranked_documents (list of str): The ranking being evaluated, best first.
+        relevance (dict): Document -> graded relevance (missing means 0).
+        k (int, optional): Cutoff. Defaults to 10.
+    """
+    dcg = sum(relevance.get(doc, 0) / math.log2(rank + 2) for rank, doc in enumerate(ranked_documents[:k]))
+    ideal = sorted(relevance.values(), reverse=True)[:k]
+    idcg = sum(gain / math.log2(rank + 2) for rank, gain in enumerate(ideal))
+    return dcg / idcg if idcg > 0 else 0.0
+
+def evaluate_cascade(full_reranker, query, candidates, keep_fractions=(0.1, 0.2, 0.5), first_stage="bm25", k=10):
+    """
+    Prints latency and NDCG@k of cascade reranking against full reranking.
+
+    Full reranking of all candidates is the reference. Its top k documents
+    get graded relevance k, k-1, ..., 1, and every other document gets 0, so
+    NDCG@k measures how much of the full top k (and its order) the cascade
+    keeps.
+    """
+    start_time = time.perf_counter()
+    full = full_reranker.rerank(query, candidates, top_k=k)
+    full_time = time.perf_counter() - start_time
+    relevance = {doc: k - rank for rank, (doc, _) in enumerate(full)}
+    print(f"\nCascade vs full reranking of {len(candidates)} candidates (first stage: "
+          f"{first_stage if isinstance(first_stage, str) else type(first_stage).__name__}):")
+    print(f"      full: {full_time:6.2f} s  NDCG@{k} 1.0000")
+
+    for keep_fraction in keep_fractions:
+        cascade = CascadeReranker(full_reranker, first_stage=first_stage, keep_fraction=keep_fraction)
+        start_time = time.perf_counter()
+        ranked = cascade.rerank(query, candidates, top_k=k)
+        elapsed = time.perf_counter() - start_time
+        ndcg = ndcg_at_k([doc for doc, _ in ranked], relevance, k)
+        print(f"keep {keep_fraction:4.0%}: {elapsed:6.2f} s  NDCG@{k} {ndcg:.4f}  ({full_time / elapsed:4.1f}x faster)")
+
+def synthetic_candidates(documents, n, seed=0):
+    """Builds n candidates of widely varying length from sentences of the given documents."""
+    rng = random.Random(seed)
+    sentences = [sentence.strip() + "." for doc in documents for sentence in doc.split(".") if sentence.strip()]
+    return [" ".join(rng.choices(sentences, k=rng.choice([1, 1, 2, 3, 6, 12]))) for _ in range(n)]
+
+def benchmark_bucketing(model, query, documents, n_candidates=2000, batch_size=32):
+    """Prints pairs/second for bucketed versus unbucketed reranking of the same candidates."""
+    candidates = synthetic_candidates(documents, n_candidates)
+    print(f"\nReranking {n_candidates} candidates (batch size {batch_size}):")
+    for bucket in (False, True):
+        reranker = Reranker(model, batch_size=batch_size, bucket=bucket)
+        reranker.rerank(query, candidates[:batch_size])  # warm-up
+        start_time = time.perf_counter()
+        reranker.rerank(query, candidates, top_k=10)
+        elapsed = time.perf_counter() - start_time
+        label = "bucketed" if bucket else "unbucketed"
+        print(f"{label:>10}: {n_candidates / elapsed:8.1f} pairs/second ({elapsed:.2f} s)")
 
 def print_results(query, sorted_doc_scores, overall_time, model_loading_time, elapsed_time):
     """Print the reranked results and timing information."""
@@ -71,3 +285,9 @@ if __name__ == "__main__":
 
     # Print results
     print_results(query, sorted_doc_scores, overall_time, model_loading_time, elapsed_time)
+
+    # Throughput on a large candidate set, with and without length bucketing
+    benchmark_bucketing(model, query, documents)
+
+    # Quality and speed of BM25-pruned cascade reranking on a 500-candidate pool
+    evaluate_cascade(Reranker(model), query, synthetic_candidates(documents, 500, seed=1))